@@ -0,0 +1,97 @@
+import os
+import re
+import json
+import hashlib
+import posixpath
+from collections import defaultdict
+
+import output
+
+
+ASSET_MANIFEST_NAME = 'asset-manifest.json'
+# where gulp writes the css and js bundles
+BUILT_ASSETS_DIRECTORY = 'roadmap-to-html'
+BUILT_ASSETS = ('css/style.css', 'js/index.js')
+IMG_FOLDER = 'img'
+FINGERPRINT_LENGTH = 10
+FINGERPRINTED_NAME_PATTERN = re.compile(
+    r'\.[0-9a-f]{{{}}}(\.[^.]+)$'.format(FINGERPRINT_LENGTH))
+
+
+def get_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as asset_file:
+        for chunk in iter(lambda: asset_file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def get_fingerprinted_path(asset_path, fingerprint):
+    base, extension = os.path.splitext(asset_path)
+    return '{}.{}{}'.format(base, fingerprint, extension)
+
+
+def is_fingerprinted(filename):
+    return bool(FINGERPRINTED_NAME_PATTERN.search(filename))
+
+
+def find_image_assets(output_dir):
+    img_folder = os.path.join(output_dir, IMG_FOLDER)
+    if not os.path.isdir(img_folder):
+        return []
+    return [
+        '{}/{}'.format(IMG_FOLDER, filename)
+        for filename in sorted(os.listdir(img_folder))
+        if not is_fingerprinted(filename)
+    ]
+
+
+def link_built_assets(output_dir, source_dir=BUILT_ASSETS_DIRECTORY):
+    """Links the bundles gulp built into an output directory other than
+    its own, such as that of another edition."""
+    for asset_path in BUILT_ASSETS:
+        source_path = os.path.join(source_dir, asset_path)
+        if os.path.exists(source_path):
+            output.link_file(source_path, os.path.join(output_dir, asset_path))
+
+
+def remove_stale_copies(output_dir, manifest):
+    """Removes the fingerprinted copies of each asset in `manifest` other
+    than its current one, listing each folder once."""
+    current_copies = set(manifest.values())
+    folders = defaultdict(set)
+    for asset_path in manifest:
+        folders[posixpath.dirname(asset_path)].add(asset_path)
+    for folder, asset_paths in folders.items():
+        for filename in os.listdir(os.path.join(output_dir, folder)):
+            path = posixpath.join(folder, filename)
+            if is_fingerprinted(filename) and path not in current_copies and \
+                    FINGERPRINTED_NAME_PATTERN.sub(r'\1', path) in asset_paths:
+                os.remove(os.path.join(output_dir, path))
+
+
+def build_asset_manifest(output_dir, asset_paths):
+    """Links a fingerprinted copy of each asset and writes a manifest of them.
+
+    Each copy is a hard link named after a hash of its contents, like
+    `css/style.0123456789.css`, so it can be cached forever: a changed asset
+    gets a new name. The manifest maps each asset path to its copy and is
+    also written to `asset-manifest.json` in the output directory. Assets
+    that have not been built are left out.
+    """
+    manifest = {}
+    for asset_path in asset_paths:
+        source_path = os.path.join(output_dir, asset_path)
+        if not os.path.exists(source_path):
+            print('Asset {} not found, skipping it'.format(source_path))
+            continue
+        fingerprinted_path = get_fingerprinted_path(
+            asset_path, get_fingerprint(source_path))
+        output.link_file(
+            source_path, os.path.join(output_dir, fingerprinted_path))
+        manifest[asset_path] = fingerprinted_path
+    remove_stale_copies(output_dir, manifest)
+    output.write_file(
+        os.path.join(output_dir, ASSET_MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
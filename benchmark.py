@@ -0,0 +1,89 @@
+"""Measures how long the build takes to start up and render its first page,
+and how the related articles stage scales with the size of the guide.
+
+Startup is measured in fresh Python processes, because that cost is paid by
+every new build, watch rebuild or worker process.
+
+    python benchmark.py
+"""
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import related
+
+REPEATS = 5
+RELATED_ARTICLE_SIZES = (500, 2000, 8000)
+
+FIRST_RENDER_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import data
+imported = time.perf_counter()
+data.env.bytecode_cache.directory = sys.argv[1]
+page = data.SingleArticle(
+    title='Benchmark', level=4, contents=data.ArticleContents.from_nodes([]))
+page.render()
+rendered = time.perf_counter()
+print(json.dumps(dict(
+    import_data=imported - start, first_render=rendered - imported)))
+"""
+
+
+def measure_first_render(template_cache_dir):
+    output = subprocess.check_output(
+        [sys.executable, '-c', FIRST_RENDER_SCRIPT, template_cache_dir])
+    return json.loads(output.decode('utf-8'))
+
+
+def median_ms(timings, key):
+    return statistics.median(timing[key] for timing in timings) * 1000
+
+
+def benchmark_startup():
+    cold_timings = []
+    warm_timings = []
+    for _ in range(REPEATS):
+        with tempfile.TemporaryDirectory() as template_cache_dir:
+            cold_timings.append(measure_first_render(template_cache_dir))
+            warm_timings.append(measure_first_render(template_cache_dir))
+    print('import data: {:.1f} ms'.format(
+        median_ms(cold_timings + warm_timings, 'import_data')))
+    print('first render, cold template cache: {:.1f} ms'.format(
+        median_ms(cold_timings, 'first_render')))
+    print('first render, warm template cache: {:.1f} ms'.format(
+        median_ms(warm_timings, 'first_render')))
+
+
+def make_token_lists(count, vocabulary_size=20000, length=300):
+    generator = random.Random(count)
+    words = ['term{}'.format(number) for number in range(vocabulary_size)]
+    return [
+        [words[int(generator.paretovariate(1.2)) % vocabulary_size]
+         for _ in range(length)]
+        for _ in range(count)]
+
+
+def benchmark_related_articles():
+    for count in RELATED_ARTICLE_SIZES:
+        token_lists = make_token_lists(count)
+        groups = [number % 20 for number in range(count)]
+        start = time.perf_counter()
+        matrix = related.build_tfidf_matrix(token_lists)
+        related.find_most_similar(
+            matrix, groups, related.RELATED_ARTICLE_COUNT)
+        print('related articles for {} articles: {:.2f} s'.format(
+            count, time.perf_counter() - start))
+
+
+def run():
+    benchmark_startup()
+    benchmark_related_articles()
+
+
+if __name__ == '__main__':
+    run()
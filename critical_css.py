@@ -0,0 +1,171 @@
+import os
+import re
+from bs4 import BeautifulSoup
+
+
+# the first few elements of a page's first article are treated as visible
+# before scrolling, along with everything above the article
+CRITICAL_ARTICLE_ELEMENTS = 10
+BELOW_THE_FOLD_SELECTORS = (
+    'footer', 'nav.neighbors', 'aside.related-articles', 'article ~ article')
+GROUPING_AT_RULES = ('@media', '@supports')
+
+COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+PSEUDO_PATTERN = re.compile(r'::?[\w-]+(\([^)]*\))?')
+
+
+class CSSRule:
+
+    def __init__(self, prelude, body=None, children=None):
+        self.prelude = prelude
+        self.body = body
+        self.children = children
+
+    def to_css(self, children_css=None):
+        if self.children is not None:
+            if children_css is None:
+                children_css = ''.join(
+                    child.to_css() for child in self.children)
+            return '{}{{{}}}'.format(self.prelude, children_css)
+        if self.body is None:
+            return self.prelude + ';'
+        return '{}{{{}}}'.format(self.prelude, self.body)
+
+
+def find_block_end(css, start):
+    """Returns the index just past the brace closing the block opened at
+    `start`, skipping over quoted strings."""
+    depth = 0
+    quote = None
+    for index in range(start, len(css)):
+        character = css[index]
+        if quote:
+            if character == quote and css[index - 1] != '\\':
+                quote = None
+        elif character in '"\'':
+            quote = character
+        elif character == '{':
+            depth += 1
+        elif character == '}':
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return len(css)
+
+
+def parse_stylesheet(css):
+    rules = []
+    css = COMMENT_PATTERN.sub('', css)
+    position = 0
+    while position < len(css):
+        brace = css.find('{', position)
+        semicolon = css.find(';', position)
+        if brace == -1 and semicolon == -1:
+            break
+        if semicolon != -1 and (brace == -1 or semicolon < brace):
+            # a statement such as @charset or @import
+            rules.append(CSSRule(css[position:semicolon].strip()))
+            position = semicolon + 1
+            continue
+        end = find_block_end(css, brace)
+        prelude = css[position:brace].strip()
+        body = css[brace + 1:end - 1]
+        if prelude.startswith(GROUPING_AT_RULES):
+            rules.append(CSSRule(prelude, children=parse_stylesheet(body)))
+        else:
+            rules.append(CSSRule(prelude, body=' '.join(body.split())))
+        position = end
+    return rules
+
+
+def get_above_the_fold(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    for selector in BELOW_THE_FOLD_SELECTORS:
+        for element in soup.select(selector):
+            element.decompose()
+    first_column = soup.select_one('article .column')
+    if first_column:
+        for element in first_column.find_all(
+                True, recursive=False)[CRITICAL_ARTICLE_ELEMENTS:]:
+            element.decompose()
+    return soup
+
+
+def selector_matches(selector, soup):
+    selector = PSEUDO_PATTERN.sub('', selector).strip() or '*'
+    try:
+        return soup.select_one(selector) is not None
+    except Exception:
+        # keep rules we cannot evaluate, to be safe
+        return True
+
+
+def is_critical(rule, soup):
+    if rule.prelude.startswith('@'):
+        # keep @font-face; @charset is not allowed in a style element
+        return rule.prelude.startswith('@font-face')
+    return any(
+        selector_matches(selector, soup)
+        for selector in rule.prelude.split(','))
+
+
+def select_critical_rules(rules, soup):
+    critical = []
+    for rule in rules:
+        if rule.children is not None:
+            children = select_critical_rules(rule.children, soup)
+            if children:
+                critical.append(rule.to_css(''.join(children)))
+        elif is_critical(rule, soup):
+            critical.append(rule.to_css())
+    return critical
+
+
+def extract_critical_css(css, html):
+    """Returns the rules of a stylesheet that style the part of a rendered
+    page that is visible before scrolling."""
+    soup = get_above_the_fold(html)
+    return ''.join(select_critical_rules(parse_stylesheet(css), soup))
+
+
+def find_representative_pages(pages):
+    representatives = {}
+    for page in pages:
+        representatives.setdefault(page.get_template_type(), page)
+    return representatives
+
+
+def is_render_blocking(element):
+    if element.find_parent('noscript'):
+        return False
+    if element.name == 'link':
+        return 'stylesheet' in element.get('rel', []) and \
+            element.get('media', 'all') != 'print'
+    if element.name == 'script':
+        return element.get('src') and not (
+            element.has_attr('async') or element.has_attr('defer'))
+    return element.name == 'style'
+
+
+def measure_render_blocking(html, output_dir, prefix=''):
+    """Returns the number of render-blocking bytes a page needs, counting
+    local stylesheets and scripts, and inline styles, plus the number of
+    render-blocking requests to other hosts, whose size is unknown."""
+    soup = BeautifulSoup(html, 'html.parser')
+    blocking_bytes = 0
+    external_requests = 0
+    for element in soup.find_all(['link', 'script', 'style']):
+        if not is_render_blocking(element):
+            continue
+        if element.name == 'style':
+            blocking_bytes += len(element.text.encode('utf-8'))
+            continue
+        url = element.get('href') or element.get('src')
+        if url.startswith('//') or '://' in url:
+            external_requests += 1
+            continue
+        local_path = os.path.join(
+            output_dir, url[len(prefix):].lstrip('/'))
+        if os.path.exists(local_path):
+            blocking_bytes += os.path.getsize(local_path)
+    return blocking_bytes, external_requests
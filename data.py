@@ -1,23 +1,80 @@
 import os
 import re
-from collections import OrderedDict
+import hashlib
+from collections import OrderedDict, Counter
 from slugify import slugify
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import (
+    Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape,
+    meta, nodes)
+from markupsafe import Markup
 from bs4 import BeautifulSoup
+from bs4.element import Tag
+import minify
 
 TEMPLATE_FOLDER = 'templates'
 PAGE_BASE = 'base.jinja'
 OUTPUT_DIR = 'roadmap-to-html'
+TEMPLATE_CACHE_DIR = os.path.join('.build_cache', 'templates')
+FRAGMENT_CACHE_SIZE = 4096
+MINIFY_HTML = True
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5')
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """Stores compiled templates on disk, so each new process loads them
+    instead of compiling them again. The folder is only created once there
+    is something to store in it."""
+
+    def dump_bytecode(self, bucket):
+        os.makedirs(self.directory, exist_ok=True)
+        super().dump_bytecode(bucket)
+
 
 env = Environment(
     loader=FileSystemLoader(TEMPLATE_FOLDER),
-    autoescape=select_autoescape(['html', 'xml'])
+    autoescape=select_autoescape(['html', 'xml']),
+    bytecode_cache=TemplateBytecodeCache(TEMPLATE_CACHE_DIR)
 )
 
-base_template = env.get_template(PAGE_BASE)
+
+def precompile_templates():
+    """Compiles every template into the bytecode cache ahead of rendering."""
+    for template_name in env.list_templates(extensions=['jinja']):
+        env.get_template(template_name)
+
+
+def find_fragment_templates(template_ast):
+    for call in template_ast.find_all(nodes.Call):
+        is_fragment_call = isinstance(call.node, nodes.Name) and \
+            call.node.name == 'render_fragment'
+        if is_fragment_call and call.args and \
+                isinstance(call.args[0], nodes.Const):
+            yield call.args[0].value
+
+
+def get_template_dependencies(template_name):
+    """Returns the named template plus every template it extends, includes
+    or renders as a fragment, directly or through other templates."""
+    dependencies = set()
+    names_to_visit = [template_name]
+    while names_to_visit:
+        name = names_to_visit.pop()
+        if name in dependencies:
+            continue
+        dependencies.add(name)
+        source, _, _ = env.loader.get_source(env, name)
+        template_ast = env.parse(source)
+        names_to_visit.extend(
+            referenced for referenced in
+            meta.find_referenced_templates(template_ast)
+            if referenced)
+        names_to_visit.extend(find_fragment_templates(template_ast))
+    return dependencies
+
 
 global_context = dict(
     prefix='',
+    algolia_index_name='test_ROADMAP',
     links=dict(
         donate=['Donate', 'http://www.rootandrebound.org/donate'],
         about_rnr=[
@@ -35,9 +92,66 @@ global_context = dict(
         hotline_number=['510-279-4662', '5102794662'],
         email_contact=['roadmap@rootandrebound.org', 'roadmap@rootandrebound.org'],
     ),
-    disclaimer="""This site, and any downloads or external sites to which it connects, are not intended to provide legal advice, but rather general legal information. No attorney-client relationship is created by using any information on this site, or any downloads or external links on the site. You should consult you own attorney if you need legal advice specific to your situation. Root & Rebound offers this site "as-is" and makes no representations or warranties of any kind concerning content, express, implied, statutory, or otherwise, including without limitation, warranties of accuracy, completeness, title, marketability, merchantability, fitness for a particular purpose, noninfringement, or the presence or absence of errors, whether or not discoverable. In particular, Root & Rebound does not make any representations of warranties that this site, or any information within it or any downloads or external links, is accurate, complete, or up-to-date, or that it will apply to your circumstances. If you or your company or agency uses information from this site, it is you responsibility to make sure that the law has not changed and applies to your particular situation."""
+    disclaimer="""This site, and any downloads or external sites to which it connects, are not intended to provide legal advice, but rather general legal information. No attorney-client relationship is created by using any information on this site, or any downloads or external links on the site. You should consult you own attorney if you need legal advice specific to your situation. Root & Rebound offers this site "as-is" and makes no representations or warranties of any kind concerning content, express, implied, statutory, or otherwise, including without limitation, warranties of accuracy, completeness, title, marketability, merchantability, fitness for a particular purpose, noninfringement, or the presence or absence of errors, whether or not discoverable. In particular, Root & Rebound does not make any representations of warranties that this site, or any information within it or any downloads or external links, is accurate, complete, or up-to-date, or that it will apply to your circumstances. If you or your company or agency uses information from this site, it is you responsibility to make sure that the law has not changed and applies to your particular situation.""",
+    # maps asset paths to fingerprinted copies, see assets.py
+    asset_manifest={},
+    # maps template types to the CSS inlined in them, see critical_css.py
+    critical_css={},
 )
 
+
+def asset_url(asset_path):
+    """Returns the URL of an asset such as 'css/style.css', pointing at its
+    fingerprinted copy when there is one."""
+    manifest = global_context['asset_manifest']
+    return '{}/{}'.format(
+        global_context['prefix'], manifest.get(asset_path, asset_path))
+
+
+global_context.update(asset=asset_url)
+
+
+class FragmentCache:
+    """A bounded cache of rendered template fragments that evicts the least
+    recently used fragment once it is full."""
+
+    def __init__(self, max_size=FRAGMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self.fragments = OrderedDict()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, template_name, key, render):
+        cache_key = (template_name, key)
+        if cache_key in self.fragments:
+            self.fragments.move_to_end(cache_key)
+            self.hits[template_name] += 1
+            return self.fragments[cache_key]
+        self.misses[template_name] += 1
+        fragment = render()
+        self.fragments[cache_key] = fragment
+        if len(self.fragments) > self.max_size:
+            self.fragments.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        self.fragments.clear()
+        self.hits.clear()
+        self.misses.clear()
+
+    def report(self):
+        lines = []
+        for template_name in sorted(set(self.hits) | set(self.misses)):
+            hits = self.hits[template_name]
+            total = hits + self.misses[template_name]
+            lines.append('{}: {} of {} renders cached ({:.0%})'.format(
+                template_name, hits, total, hits / total))
+        return '\n'.join(lines)
+
+
+fragment_cache = FragmentCache()
+
+
 class PageIndex:
 
     def __init__(self):
@@ -73,9 +187,12 @@ class PageIndex:
 
 class Chapter:
 
-    def __init__(self, text, soup_index):
+    def __init__(self, text, soup_index, merged_from=None):
         self.text = text
         self.soup_index = soup_index
+        self.top_index = int(soup_index.split('.')[0])
+        # the raw h1 chapters that were merged into this one
+        self.merged_from = merged_from or []
 
     def __repr__(self):
         return "Chapter({})".format(self.text)
@@ -157,8 +274,53 @@ class TOCLinkItem:
         return "TOCLinkItem({})".format(self.text)
 
 
+class ArticleContents:
+    """The finished contents of an article, kept as serialized HTML.
+
+    The headings, plain text and images that later stages look up are
+    worked out once, when the contents are finished.
+    """
+
+    def __init__(self, html, headings, text, images):
+        self.html = html
+        self.headings = headings
+        self.text = text
+        # (src, alt) pairs
+        self.images = images
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        tags = []
+        for node in nodes:
+            # page links wrap each tag in a document of its own
+            if isinstance(node, BeautifulSoup):
+                tags.extend(
+                    child for child in node.contents
+                    if isinstance(child, Tag))
+            elif isinstance(node, Tag):
+                tags.append(node)
+        return cls(
+            '\n'.join(str(node) for node in nodes),
+            headings=[tag.text for tag in tags if tag.name in HEADING_TAGS],
+            text='\n'.join(tag.text for tag in tags),
+            images=[
+                (img['src'], img.get('alt', ''))
+                for tag in tags for img in tag.find_all('img')])
+
+    def __bool__(self):
+        return bool(self.html)
+
+    def __str__(self):
+        return self.html
+
+    def __html__(self):
+        return self.html
+
+
 class ContentItem:
     template = "base.jinja"
+    # groups pages in the build report
+    page_type = "article"
 
     def __init__(
             self, title, level, soup_index=None, page_number=None, parent=None,
@@ -175,6 +337,10 @@ class ContentItem:
         self.contents = contents
         self.toc_listing = toc_listing
         self.content_anchor = content_anchor
+        # hash of the last written output, see offline.py
+        self.content_hash = None
+        # similar articles in other chapters, see related.py
+        self.related = []
 
     def __repr__(self):
         return '{class_}("{title}")'.format(
@@ -183,6 +349,16 @@ class ContentItem:
     def get_slug(self):
         return slugify(self.title)[:50]
 
+    def get_template_type(self):
+        return self.__class__.__name__
+
+    def get_chapter(self):
+        item = self
+        while item.parent:
+            item = item.parent
+        if item.level == 0:
+            return item
+
     def get_path(self):
         fragments = [self.get_slug()]
         parent = self.parent
@@ -199,41 +375,44 @@ class ContentItem:
         template = env.get_template(self.template)
         return template.render(self.get_context())
 
-    def write(self):
-        output_directory = os.path.join(OUTPUT_DIR, self.get_path())
-        os.makedirs(output_directory, exist_ok=True)
-        output_path = os.path.join(output_directory, 'index.html')
-        with open(output_path, 'w') as output_file:
-            output_file.write(self.render())
+    def render_output(self):
+        html = self.render()
+        if MINIFY_HTML:
+            html = minify.minify_page(html, self.page_type)
+        return html
+
+    def write(self, writer):
+        html = self.render_output().encode('utf-8')
+        self.content_hash = hashlib.sha256(html).hexdigest()[:16]
+        writer.write(os.path.join(self.get_path(), 'index.html'), html)
+
+    def finish_contents(self, contents):
+        """Stores the final contents, and lets go of the parsed document."""
+        self.contents = contents
+        self.toc_listing = None
+        self.content_anchor = None
 
     def heading_text(self):
-        return '\n'.join([
-            tag.text
-            for tag in self.contents
-            if tag.name in ('h1', 'h2', 'h3', 'h4', 'h5')
-        ])
+        return '\n'.join(self.contents.headings)
 
     def has_img_tags(self):
-        for content in self.contents:
-            if content.find('img'):
-                return True
+        return bool(self.contents.images)
 
     def get_img_tags(self):
-        for content in self.contents:
-            link = 'http://roadmap.rootandrebound.org/{}/'.format(
-                    self.get_path())
-            next_page = self.next.page_number if self.next else ''
-            page_range = '{} - {}'.format(self.page_number, next_page)
-            for tag in content.find_all('img'):
-                yield (
-                        link,
-                        page_range,
-                        self.title,
-                        tag['src'],
-                        tag.get('alt', ''))
+        link = 'http://roadmap.rootandrebound.org/{}/'.format(
+                self.get_path())
+        next_page = self.next.page_number if self.next else ''
+        page_range = '{} - {}'.format(self.page_number, next_page)
+        for src, alt in self.contents.images:
+            yield (
+                    link,
+                    page_range,
+                    self.title,
+                    src,
+                    alt)
 
     def text(self):
-        return '\n'.join([tag.text for tag in self.contents])
+        return self.contents.text
 
     def as_dict(self):
         return dict(
@@ -297,6 +476,7 @@ class ChapterSection(ContentIndex):
 
 
 class ChapterIndex(ContentIndex):
+    page_type = "chapter index"
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -313,6 +493,7 @@ class ChapterIndex(ContentIndex):
 
 class SplashPage(ContentPage):
     template = "splash_page.jinja"
+    page_type = "other"
 
     def get_path(self):
         return ''
@@ -320,6 +501,7 @@ class SplashPage(ContentPage):
 
 class SearchPage(ContentPage):
     template = "search_page.jinja"
+    page_type = "other"
 
     def get_path(self):
         return 'search'
@@ -327,11 +509,37 @@ class SearchPage(ContentPage):
 
 class PageIndexPage(ContentPage):
     template = "page_index.jinja"
+    page_type = "page index"
 
     def get_path(self):
         return 'page-index'
 
 
+def fragment_key(item):
+    if isinstance(item, ContentItem):
+        return (item.get_path(), item.title)
+    return item
+
+
+def render_fragment(template_name, key, **context):
+    """Renders a template fragment, or reuses the output of an earlier render
+    with the same key.
+
+    The key is a list of the content items (or plain values) the fragment
+    depends on, such as a page's parent for its breadcrumbs. Only fragments
+    shared by several pages are worth caching; a page's own table of
+    contents and neighbors are included directly.
+    """
+    def render():
+        template = env.get_template(template_name)
+        return Markup(template.render(dict(global_context, **context)))
+    cache_key = tuple(fragment_key(item) for item in key)
+    return fragment_cache.get(template_name, cache_key, render)
+
+
+env.globals['render_fragment'] = render_fragment
+
+
 level_definitions = {
     0: ChapterIndex,
     1: ChapterSection,
@@ -0,0 +1,235 @@
+"""Publishes only the output files that changed since the last deploy.
+
+    python deploy.py ../roadmap-deploy            # a directory
+    python deploy.py ../roadmap.git               # a local bare git repo
+
+Files are identified by their git blob hash, so the state of a git target is
+read straight from its branch. For a directory, the state of the last deploy
+to it is kept in .build_cache/deploy/targets/, and the last published state
+of each output directory, which builds compare with, in .build_cache/deploy/.
+"""
+import os
+import json
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import links
+import output
+
+
+OUTPUT_DIRECTORY = 'roadmap-to-html'
+DEPLOY_STATE_DIRECTORY = os.path.join('.build_cache', 'deploy')
+DEFAULT_BRANCH = 'gh-pages'
+HASH_WORKERS = 8
+
+
+def hash_git_blob(path):
+    """Returns the git blob hash of a file, so that the files of a build can
+    be compared with the ones on a git branch."""
+    digest = hashlib.sha1(
+        'blob {}\0'.format(os.path.getsize(path)).encode('ascii'))
+    with open(path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_deployable_files(output_dir):
+    return [
+        path for path in links.find_output_files(output_dir)
+        if path not in links.SKIPPED_PAGES]
+
+
+def hash_output(output_dir):
+    paths = find_deployable_files(output_dir)
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        hashes = executor.map(
+            hash_git_blob, [os.path.join(output_dir, path) for path in paths])
+        return dict(zip(paths, hashes))
+
+
+def build_deploy_manifest(current, deployed):
+    """Compares the hashes of the output files with those last deployed."""
+    return dict(
+        added={
+            path: file_hash for path, file_hash in current.items()
+            if path not in deployed},
+        changed={
+            path: file_hash for path, file_hash in current.items()
+            if path in deployed and deployed[path] != file_hash},
+        deleted=sorted(path for path in deployed if path not in current),
+        unchanged=sum(
+            1 for path, file_hash in current.items()
+            if deployed.get(path) == file_hash))
+
+
+def get_state_name(output_dir):
+    return os.path.basename(os.path.normpath(output_dir))
+
+
+def get_state_path(output_dir):
+    return os.path.join(
+        DEPLOY_STATE_DIRECTORY, get_state_name(output_dir) + '.json')
+
+
+def get_target_state_path(target):
+    key = hashlib.sha1(
+        os.path.abspath(target).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(DEPLOY_STATE_DIRECTORY, 'targets', key + '.json')
+
+
+def get_manifest_path(output_dir):
+    return os.path.join(
+        DEPLOY_STATE_DIRECTORY, get_state_name(output_dir) + '-manifest.json')
+
+
+def read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as json_file:
+        return json.load(json_file)
+
+
+def describe_manifest(manifest):
+    return '{} added, {} changed, {} deleted, {} unchanged'.format(
+        len(manifest['added']), len(manifest['changed']),
+        len(manifest['deleted']), manifest['unchanged'])
+
+
+def write_deploy_manifest(output_dir=OUTPUT_DIRECTORY):
+    """Writes the files that changed since the last deploy of `output_dir`
+    to the deploy state folder, for review and for `publish`."""
+    deployed = read_json(get_state_path(output_dir), {})
+    manifest = build_deploy_manifest(hash_output(output_dir), deployed)
+    output.write_file(
+        get_manifest_path(output_dir),
+        json.dumps(manifest, indent=2, sort_keys=True))
+    print('Deploy manifest: {}'.format(describe_manifest(manifest)))
+    return manifest
+
+
+def is_bare_git_repo(target):
+    return os.path.isfile(os.path.join(target, 'HEAD')) and \
+        os.path.isdir(os.path.join(target, 'objects'))
+
+
+def run_git(target, arguments, input_text=None, env=None):
+    return subprocess.run(
+        ['git', '--git-dir', target] + arguments, input=input_text,
+        stdout=subprocess.PIPE, check=True, universal_newlines=True,
+        env=env).stdout
+
+
+def get_branch_commit(target, branch):
+    try:
+        return run_git(
+            target,
+            ['rev-parse', '--verify', '-q', 'refs/heads/' + branch]).strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
+def read_git_state(target, branch):
+    commit = get_branch_commit(target, branch)
+    if not commit:
+        return {}
+    listing = run_git(target, ['ls-tree', '-r', '-z', commit])
+    state = {}
+    for entry in listing.split('\0'):
+        if entry:
+            info, path = entry.split('\t', 1)
+            state[path] = info.split()[2]
+    return state
+
+
+def publish_to_git(output_dir, manifest, target, branch):
+    """Commits the manifest's changes on top of `branch` without a working
+    tree, writing only the added and changed files into the repo."""
+    updated = sorted(list(manifest['added']) + list(manifest['changed']))
+    index_path = os.path.join(target, 'deploy-index')
+    env = dict(os.environ, GIT_INDEX_FILE=os.path.abspath(index_path))
+    parent = get_branch_commit(target, branch)
+    try:
+        if parent:
+            run_git(target, ['read-tree', parent], env=env)
+        blobs = run_git(
+            target, ['hash-object', '-w', '--stdin-paths'],
+            '\n'.join(
+                os.path.abspath(os.path.join(output_dir, path))
+                for path in updated),
+            env=env).split() if updated else []
+        index_info = [
+            '100644 {}\t{}'.format(blob, path)
+            for blob, path in zip(blobs, updated)]
+        index_info.extend(
+            '0 {}\t{}'.format('0' * 40, path) for path in manifest['deleted'])
+        run_git(
+            target, ['update-index', '--index-info'],
+            '\n'.join(index_info) + '\n', env=env)
+        tree = run_git(target, ['write-tree'], env=env).strip()
+        arguments = ['commit-tree', tree, '-m', 'Deploy: {}'.format(
+            describe_manifest(manifest))]
+        if parent:
+            arguments.extend(['-p', parent])
+        commit = run_git(target, arguments, env=env).strip()
+        run_git(target, ['update-ref', 'refs/heads/' + branch, commit])
+    finally:
+        if os.path.exists(index_path):
+            os.remove(index_path)
+    return commit
+
+
+def publish_to_directory(output_dir, manifest, target):
+    for path in sorted(list(manifest['added']) + list(manifest['changed'])):
+        with open(os.path.join(output_dir, path), 'rb') as input_file:
+            output.write_file(os.path.join(target, path), input_file)
+    for path in manifest['deleted']:
+        destination = os.path.join(target, path)
+        if os.path.exists(destination):
+            os.remove(destination)
+        output.remove_empty_folders(os.path.dirname(destination), target)
+
+
+def publish(target, output_dir=OUTPUT_DIRECTORY, branch=DEFAULT_BRANCH):
+    """Syncs only the files that changed since the last deploy to a
+    directory or to `branch` of a local bare git repo."""
+    current = hash_output(output_dir)
+    if is_bare_git_repo(target):
+        deployed = read_git_state(target, branch)
+    else:
+        deployed = read_json(get_target_state_path(target), {})
+    manifest = build_deploy_manifest(current, deployed)
+    if is_bare_git_repo(target):
+        if manifest['added'] or manifest['changed'] or manifest['deleted']:
+            commit = publish_to_git(output_dir, manifest, target, branch)
+            print('Committed {} to {}'.format(commit[:10], branch))
+    else:
+        publish_to_directory(output_dir, manifest, target)
+        output.write_file(
+            get_target_state_path(target),
+            json.dumps(current, indent=2, sort_keys=True))
+    output.write_file(
+        get_state_path(output_dir),
+        json.dumps(current, indent=2, sort_keys=True))
+    print('Published to {}: {}'.format(target, describe_manifest(manifest)))
+    return manifest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        'target', help='a directory, or a local bare git repo')
+    parser.add_argument(
+        '--output-dir', default=OUTPUT_DIRECTORY,
+        help='the built site to publish')
+    parser.add_argument(
+        '--branch', default=DEFAULT_BRANCH,
+        help='the branch to commit to, when the target is a git repo')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    publish(args.target, args.output_dir, args.branch)
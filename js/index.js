@@ -34,7 +34,9 @@ function searchQueryMetadataTemplate(searchData){
 
 function initializeSearch() {
   var client = algoliasearch(ALGOLIA_APP_ID, ALGOLIA_PUBLIC_KEY);
-  var index = client.initIndex(ALGOLIA_INDEX_NAME);
+  // each edition of the guide names its own index, see main.BuildConfig
+  var indexName = $('body').attr('data-algolia-index') || ALGOLIA_INDEX_NAME;
+  var index = client.initIndex(indexName);
   var search_term = getParameterByName('q');
   if( search_term ){
     // from:
@@ -103,7 +105,34 @@ function callByBodyDataPagePath(path, func){
 }
 
 
+function setUpOfflineReading(){
+  // the service worker saves whole chapters when asked, see offline.py
+  if (!('serviceWorker' in navigator)){
+    return;
+  }
+  var prefix = $('body').attr('data-prefix') || '';
+  navigator.serviceWorker.register(prefix + '/service-worker.js');
+  var button = $('.offline-chapter__button');
+  button.prop('hidden', false);
+  button.on('click', function(){
+    button.prop('disabled', true).text('Saving this chapter for offline reading…');
+    navigator.serviceWorker.ready.then(function(registration){
+      registration.active.postMessage({
+        type: 'precache-chapter',
+        chapter: button.data('chapter')
+      });
+    });
+  });
+  navigator.serviceWorker.addEventListener('message', function(event){
+    if (event.data.type == 'chapter-precached'){
+      button.text('This chapter is saved for offline reading');
+    }
+  });
+}
+
+
 $(function() {
   callByBodyDataPagePath('search', initializeSearch);
   callByBodyDataPagePath('', pullTopPages);
+  setUpOfflineReading();
 });
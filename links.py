@@ -0,0 +1,223 @@
+"""Checks the links of a built site.
+
+    python links.py                     # check roadmap-to-html
+    python links.py --record-known      # accept its broken links as known
+
+Links that were already broken when they were recorded in
+known_broken_links.json are reported without failing the check.
+"""
+import os
+import re
+import html
+import json
+import time
+import argparse
+import posixpath
+from urllib.parse import unquote, urlsplit
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+
+OUTPUT_DIRECTORY = 'roadmap-to-html'
+KNOWN_BROKEN_LINKS_PATH = 'known_broken_links.json'
+# intermediate files of the conversion, which are not part of the site
+SKIPPED_PAGES = ('raw_index.html', 'nice_index.html')
+CHECK_WORKERS = os.cpu_count() or 1
+CHECK_CHUNK_SIZE = 32
+REPORT_LIMIT = 50
+
+LINK_PATTERN = re.compile(
+    r'''<[a-z][^>]*?\s(?:href|src)\s*=\s*(?:"([^"]*)"|'([^']*)')''',
+    re.IGNORECASE)
+ID_PATTERN = re.compile(
+    r'''<[a-z][^>]*?\s(?:id|name)\s*=\s*(?:"([^"]*)"|'([^']*)')''',
+    re.IGNORECASE)
+EXTERNAL_PATTERN = re.compile(r'^([a-z][a-z0-9+.-]*:|//)', re.IGNORECASE)
+
+
+class BrokenLinksError(Exception):
+    pass
+
+
+def find_values(pattern, text):
+    return [
+        html.unescape(double_quoted or single_quoted)
+        for double_quoted, single_quoted in pattern.findall(text)]
+
+
+def scan_page(path):
+    """Returns the element ids and the links of one HTML file."""
+    with open(path, 'r', encoding='utf-8') as page_file:
+        text = page_file.read()
+    return set(find_values(ID_PATTERN, text)), find_values(LINK_PATTERN, text)
+
+
+def find_output_files(output_dir):
+    paths = []
+    for folder, folder_names, filenames in os.walk(output_dir):
+        folder_names.sort()
+        for filename in sorted(filenames):
+            paths.append(os.path.relpath(
+                os.path.join(folder, filename), output_dir).replace(
+                    os.sep, '/'))
+    return paths
+
+
+def resolve_link(link, page_path, prefix=''):
+    """Returns the output file and the fragment a link points to, or None
+    for links outside the site."""
+    if EXTERNAL_PATTERN.match(link):
+        return None
+    parts = urlsplit(link)
+    path = unquote(parts.path)
+    if not path:
+        target = page_path
+    elif path.startswith('/'):
+        if prefix and not (path == prefix or path.startswith(prefix + '/')):
+            return None
+        target = path[len(prefix):].lstrip('/')
+    else:
+        target = posixpath.join(posixpath.dirname(page_path), path)
+    target = posixpath.normpath(target) if target else '.'
+    if target == '.':
+        target = 'index.html'
+    elif path.endswith('/'):
+        target = target + '/index.html'
+    return target, unquote(parts.fragment)
+
+
+def find_broken_links(pages, files, prefix=''):
+    """Checks each page's links against the set of output files and the
+    ids of the pages they point to.
+
+    `pages` maps each HTML file to its ids and links. Returns a list of
+    (page, link, reason) tuples.
+    """
+    broken = []
+    for page_path, (_, page_links) in pages.items():
+        for link in page_links:
+            resolved = resolve_link(link, page_path, prefix)
+            if resolved is None or link == '#':
+                continue
+            target, fragment = resolved
+            if target not in files and target + '/index.html' in files:
+                target = target + '/index.html'
+            if target not in files:
+                broken.append((page_path, link, 'missing file'))
+            elif fragment and target in pages and \
+                    fragment not in pages[target][0]:
+                broken.append((page_path, link, 'missing anchor'))
+    return broken
+
+
+def get_link_key(page_path, link, prefix=''):
+    """Names a link by its page and what it points to, without the prefix,
+    so every edition shares the known broken links."""
+    target, fragment = resolve_link(link, page_path, prefix)
+    return '{} -> {}{}'.format(
+        page_path, target, '#' + fragment if fragment else '')
+
+
+def read_known_broken_links(path=KNOWN_BROKEN_LINKS_PATH):
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r') as known_file:
+        return set(json.load(known_file))
+
+
+def write_known_broken_links(broken, prefix='', path=KNOWN_BROKEN_LINKS_PATH):
+    keys = sorted({
+        get_link_key(page_path, link, prefix)
+        for page_path, link, _ in broken})
+    with open(path, 'w') as known_file:
+        json.dump(keys, known_file, indent=2)
+        known_file.write('\n')
+    print('Recorded {} known broken links in {}'.format(len(keys), path))
+
+
+def format_report(broken):
+    by_page = defaultdict(list)
+    for page_path, link, reason in broken:
+        by_page[page_path].append('{} ({})'.format(link, reason))
+    lines = ['{} broken links on {} pages:'.format(len(broken), len(by_page))]
+    for page_path in sorted(by_page)[:REPORT_LIMIT]:
+        lines.append('  {}'.format(page_path))
+        lines.extend('    {}'.format(link) for link in by_page[page_path])
+    if len(by_page) > REPORT_LIMIT:
+        lines.append('  and {} more pages'.format(len(by_page) - REPORT_LIMIT))
+    return '\n'.join(lines)
+
+
+def scan_site(output_dir, prefix='', workers=CHECK_WORKERS):
+    """Returns the broken links of the built site and the number of links
+    and pages checked.
+
+    Every output file is listed once and every page is scanned for its ids
+    and links once, across a pool of processes; each link is then checked
+    with set lookups.
+    """
+    files = set(find_output_files(output_dir))
+    page_paths = [
+        path for path in sorted(files)
+        if path.endswith('.html') and path not in SKIPPED_PAGES]
+    full_paths = [os.path.join(output_dir, path) for path in page_paths]
+    if workers == 1:
+        scans = list(map(scan_page, full_paths))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            scans = list(executor.map(
+                scan_page, full_paths, chunksize=CHECK_CHUNK_SIZE))
+    broken = find_broken_links(dict(zip(page_paths, scans)), files, prefix)
+    link_count = sum(len(page_links) for _, page_links in scans)
+    return broken, link_count, len(page_paths)
+
+
+def check_links(
+        output_dir, prefix='', workers=CHECK_WORKERS, known_broken=(),
+        strict=False):
+    """Fails with a report of every link in the built site that points to
+    a missing file or to a missing id on an existing page, unless it is one
+    of the `known_broken` link keys. With `strict` known ones fail too.
+    """
+    start = time.perf_counter()
+    broken, link_count, page_count = scan_site(output_dir, prefix, workers)
+    new_broken = [
+        (page_path, link, reason) for page_path, link, reason in broken
+        if strict or get_link_key(page_path, link, prefix) not in known_broken]
+    if len(new_broken) < len(broken):
+        print('{} links are known to be broken, see {}'.format(
+            len(broken) - len(new_broken), KNOWN_BROKEN_LINKS_PATH))
+    if new_broken:
+        print(format_report(new_broken))
+        raise BrokenLinksError('{} of {} links are broken'.format(
+            len(new_broken), link_count))
+    print('Checked {} links on {} pages in {:.2f}s'.format(
+        link_count, page_count, time.perf_counter() - start))
+    return broken
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        'output_dir', nargs='?', default=OUTPUT_DIRECTORY,
+        help='the built site to check')
+    parser.add_argument(
+        '--prefix', default='', help='the URL prefix of the site')
+    parser.add_argument(
+        '--record-known', action='store_true',
+        help='record every broken link as known instead of failing')
+    parser.add_argument(
+        '--strict', action='store_true',
+        help='fail on the known broken links too')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.record_known:
+        broken, _, _ = scan_site(args.output_dir, args.prefix)
+        write_known_broken_links(broken, args.prefix)
+    else:
+        check_links(
+            args.output_dir, args.prefix,
+            known_broken=read_known_broken_links(), strict=args.strict)
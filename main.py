@@ -1,18 +1,47 @@
 import re
 import os
 import shutil
+import time
+import argparse
+import hashlib
+import tempfile
 import data
+import assets
+import minify
+import critical_css
+import offline
+import output
+import links
+import deploy
+import related
 import json
+import mammoth
 from bs4 import BeautifulSoup
 from bs4.element import Tag, NavigableString
+from urllib.request import urlopen
+from concurrent.futures import ProcessPoolExecutor
 import Levenshtein
 
 
+SOURCE_DOCX_PATH = 'source.docx'
 STYLE_MAP_PATH = 'stylemap.txt'
 OUTPUT_DIRECTORY = 'roadmap-to-html'
 IMG_PATH = 'img'
+CACHE_DIRECTORY = '.build_cache'
+CONVERSION_CACHE_DIRECTORY = os.path.join(CACHE_DIRECTORY, 'conversions')
+# the docx and style map a cached conversion was made from
+CONVERSION_SOURCE_NAME = 'source.txt'
+WATCH_POLL_INTERVAL = 0.5
+BROWSER_SYNC_RELOAD_URL = 'http://localhost:3000/__browser_sync__?method=reload'
 RAW_INDEX_PATH = os.path.join(OUTPUT_DIRECTORY, 'raw_index.html')
 NICE_INDEX_PATH = os.path.join(OUTPUT_DIRECTORY, 'nice_index.html')
+CONTENTS_JSON_PATH = 'all_contents.json'
+POST_PROCESS_WORKERS = os.cpu_count() or 1
+# articles sent to a worker at a time, to amortize pickling overhead
+POST_PROCESS_CHUNK_SIZE = 16
+# the id mammoth gives a footnote reference, like "footnote-ref-4"
+FOOTNOTE_REF_ID_PATTERN = re.compile(r'footnote-ref[^"]*-(\w+)')
+ALGOLIA_INDEX_NAME = 'test_ROADMAP'
 
 TOC_CLASSES = {'toc1', 'toc2', 'toc3', 'toc4'}
 
@@ -27,6 +56,56 @@ CHAPTER_TITLES_TO_EXCLUDE = [
 ]
 
 
+class BuildConfig:
+    """Where one edition of the guide comes from and where it goes.
+
+    Editions such as a yearly revision or a regional variant each get their
+    own source document, output directory, URL prefix and search index, and
+    share the template and conversion caches.
+    """
+
+    def __init__(
+            self, name='default', source_docx=SOURCE_DOCX_PATH,
+            style_map=STYLE_MAP_PATH, output_dir=OUTPUT_DIRECTORY, prefix='',
+            algolia_index_name=ALGOLIA_INDEX_NAME, contents_json=None):
+        self.name = name
+        self.source_docx = source_docx
+        self.style_map = style_map
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.algolia_index_name = algolia_index_name
+        if contents_json is None:
+            contents_json = CONTENTS_JSON_PATH if name == 'default' else \
+                'all_contents-{}.json'.format(name)
+        self.contents_json = contents_json
+        self.raw_index_path = os.path.join(output_dir, 'raw_index.html')
+        self.nice_index_path = os.path.join(output_dir, 'nice_index.html')
+
+    def in_directory(self, output_dir):
+        """Returns a copy of this config that writes to `output_dir`."""
+        return BuildConfig(
+            self.name, self.source_docx, self.style_map, output_dir,
+            self.prefix, self.algolia_index_name, self.contents_json)
+
+    def __repr__(self):
+        return 'BuildConfig({})'.format(self.name)
+
+
+def load_editions(path):
+    with open(path, 'r') as editions_file:
+        return [BuildConfig(**edition) for edition in json.load(editions_file)]
+
+
+def find_edition(editions, name=None):
+    """Returns the edition called `name`, or the first one."""
+    if name is None:
+        return editions[0]
+    for edition in editions:
+        if edition.name == name:
+            return edition
+    raise ValueError('No edition named {!r}'.format(name))
+
+
 def idx_to_str(index):
     return "{num:06d}".format(num=index)
 
@@ -54,9 +133,8 @@ def is_toc_item(class_name):
     return class_name in TOC_CLASSES
 
 
-def write_prettified_raw_index(soup):
-    with open(NICE_INDEX_PATH, 'w') as index_file:
-        index_file.write(soup.prettify())
+def write_prettified_raw_index(soup, path=NICE_INDEX_PATH):
+    output.write_file(path, soup.prettify())
 
 
 def remove_trailing_footnote_text(string):
@@ -209,10 +287,6 @@ def build_content_items(toc_entries):
     return items
 
 
-def soup_top_index(soup_index):
-    return int(soup_index.split('.')[0])
-
-
 def find_prev_from_index(index, items):
     # defined as prev sibling or parent
     item = items[index]
@@ -239,40 +313,51 @@ def link_parents_and_neighbors(content_items):
 def are_the_same_chapter(a, b):
     if not a or not b:
         return False
-    prev_index = soup_top_index(a.soup_index)
-    this_index = soup_top_index(b.soup_index)
-    if (this_index - prev_index) < 4:
+    if (b.top_index - a.top_index) < 4:
         return True
     elif (a.text in b.text) or (b.text in a.text):
         return True
     return False
 
 
-def merge_two(a, b):
-    if (a.text in b.text) or (b.text in a.text):
-        text = a.text
-    else:
-        text = a.text + ' ' + b.text
-    return data.Chapter(text=text, soup_index=a.soup_index)
+def texts_overlap(a, b):
+    return (a in b) or (b in a)
+
+
+def close_chapter_run(text, chapter_run):
+    return data.Chapter(
+        text=text, soup_index=chapter_run[0].soup_index,
+        merged_from=chapter_run)
 
 
 def merge_adjacent_chapter_items(chapters):
+    """Merges each run of h1s that belong to the same chapter.
+
+    A chapter title is often split across several h1s. Empty h1s are
+    skipped, since their text is part of every title. Each remaining h1 is
+    compared with the previous h1 of the run and with the text merged so
+    far, and each merged chapter is built once its run ends, so the pass
+    is linear in the number of h1s. The input list and its chapters are
+    left untouched.
+    """
     merged_chapters = []
-    last_chapter = None
-    while chapters:
-        next_chapter = chapters.pop(0)
-        if last_chapter:
-            if are_the_same_chapter(last_chapter, next_chapter):
-                merged = merge_two(last_chapter, next_chapter)
-                merged_chapters.append(merged)
-                last_chapter = None
-            else:
-                merged_chapters.append(last_chapter)
-                last_chapter = next_chapter
-        else:
-            last_chapter = next_chapter
-    if not chapters and last_chapter:
-        merged_chapters.append(last_chapter)
+    chapter_run = []
+    text = ''
+    for chapter in chapters:
+        if not chapter.text.strip():
+            continue
+        if chapter_run and not (
+                are_the_same_chapter(chapter_run[-1], chapter) or
+                texts_overlap(text, chapter.text)):
+            merged_chapters.append(close_chapter_run(text, chapter_run))
+            chapter_run = []
+        if not chapter_run:
+            text = chapter.text
+        elif not texts_overlap(text, chapter.text):
+            text = text + ' ' + chapter.text
+        chapter_run.append(chapter)
+    if chapter_run:
+        merged_chapters.append(close_chapter_run(text, chapter_run))
     return merged_chapters
 
 
@@ -370,8 +455,8 @@ def update_contents(soup, items):
             item.post_process_contents()
 
 
-def write_to_json(items):
-    with open('all_contents.json', 'w') as outfile:
+def write_to_json(items, path=CONTENTS_JSON_PATH):
+    with open(path, 'w') as outfile:
         json.dump([item.as_dict() for item in items], outfile, indent=2)
     print("wrote JSON")
 
@@ -383,7 +468,7 @@ def is_footnote(id_string):
 
 def is_footnote_ref(id_string):
     if id_string:
-        return 'footnote-ref' in id_string
+        return bool(FOOTNOTE_REF_ID_PATTERN.search(id_string))
 
 
 def extract_footnotes(soup):
@@ -410,7 +495,7 @@ def add_footnotes_to_article(soup, content_item, footnote_index):
     if footnote_refs:
         footnote_list = soup.new_tag('ol', **{'class': 'footnotes'})
         for ref in footnote_refs:
-            number = ref['id'].split('-')[-1]
+            number = FOOTNOTE_REF_ID_PATTERN.search(ref['id']).group(1)
             footnote_ids.append(number)
             ref.string = '[{}]'.format(number)
             sup = ref.parent
@@ -458,6 +543,63 @@ def extract_redundant_title_heading(content_item):
             content_item.contents.remove(item)
 
 
+class ArticleFragment:
+    """The title and contents of one article, parsed on their own so that
+    articles can be post-processed in separate processes."""
+
+    def __init__(self, title, contents):
+        self.title = title
+        self.contents = contents
+
+
+def split_into_fragments(content_items, footnote_index):
+    """Serializes each article with the footnotes it refers to."""
+    footnote_html = {
+        number: str(footnote) for number, footnote in footnote_index.items()}
+    prefix = data.global_context['prefix']
+    for content_item in content_items:
+        html = ''.join(str(node) for node in content_item.contents)
+        footnotes = {
+            number: footnote_html[number]
+            for number in FOOTNOTE_REF_ID_PATTERN.findall(html)
+            if number in footnote_html}
+        yield content_item.title, html, footnotes, prefix
+
+
+def post_process_fragment(fragment):
+    title, html, footnotes, prefix = fragment
+    data.global_context['prefix'] = prefix
+    soup = BeautifulSoup(html, 'html.parser')
+    article = ArticleFragment(title, list(soup.contents))
+    footnote_index = {
+        number: BeautifulSoup(footnote, 'html.parser').li
+        for number, footnote in footnotes.items()}
+    add_footnotes_to_article(soup, article, footnote_index)
+    extract_redundant_title_heading(article)
+    add_page_links_to_article(article)
+    return data.ArticleContents.from_nodes(article.contents)
+
+
+def post_process_content_items(
+        content_items, footnote_index, workers=POST_PROCESS_WORKERS):
+    """Adds footnotes and page links to every article and drops headings
+    that repeat its title, spreading the articles across processes.
+
+    Results come back in document order, as serialized contents with the
+    lookups later stages need.
+    """
+    fragments = split_into_fragments(content_items, footnote_index)
+    if workers == 1:
+        results = list(map(post_process_fragment, fragments))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                post_process_fragment, fragments,
+                chunksize=POST_PROCESS_CHUNK_SIZE))
+    for content_item, contents in zip(content_items, results):
+        content_item.finish_contents(contents)
+
+
 def create_page_index(content_items):
     page_index = data.PageIndex()
     for item in content_items:
@@ -465,26 +607,154 @@ def create_page_index(content_items):
     return page_index
 
 
-def move_img_files():
+def move_img_files(output_directory=OUTPUT_DIRECTORY):
     # find all the image files in the output directory
     img_file_extensions = ('.png', '.tiff', '.jpeg', '.x-emf')
-    items = os.listdir(OUTPUT_DIRECTORY)
-    destination_folder = os.path.join(OUTPUT_DIRECTORY, 'img')
+    destination_folder = os.path.join(output_directory, 'img')
     os.makedirs(destination_folder, exist_ok=True)
     image_files = [
-        item for item in os.listdir(OUTPUT_DIRECTORY)
+        item for item in os.listdir(output_directory)
         if os.path.splitext(item)[-1] in img_file_extensions
     ]
     for image_file in image_files:
-        from_path = os.path.join(OUTPUT_DIRECTORY, image_file)
+        from_path = os.path.join(output_directory, image_file)
         to_path = os.path.join(destination_folder, image_file)
         shutil.move(from_path, to_path)
 
 
+def hash_file(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as input_file:
+        for chunk in iter(lambda: input_file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest
+
+
+def get_conversion_key(docx_path, style_map):
+    digest = hash_file(docx_path)
+    digest.update(style_map.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ImageWriter:
+    """Streams each image mammoth finds into a folder as it is converted,
+    and hard-links it into the conversion cache, so it is written once.
+
+    Images are numbered in document order with an extension taken from their
+    content type, which is how the mammoth command line tool names them.
+    """
+
+    def __init__(self, destination_folder, cache_folder=None):
+        self.destination_folder = destination_folder
+        self.cache_folder = cache_folder
+        self.filenames = []
+
+    def __call__(self, image):
+        extension = image.content_type.split('/')[-1]
+        filename = '{}.{}'.format(len(self.filenames) + 1, extension)
+        path = os.path.join(self.destination_folder, filename)
+        with image.open() as image_bytes:
+            output.write_file(path, image_bytes)
+        if self.cache_folder:
+            output.link_file(path, os.path.join(self.cache_folder, filename))
+        self.filenames.append(filename)
+        return {'src': filename}
+
+
+def get_conversion_source(docx_path, style_map_path):
+    return '\n'.join(
+        os.path.abspath(path) for path in (docx_path, style_map_path))
+
+
+def remove_older_conversions(source, current_folder):
+    """Deletes the cached conversions of `source` other than the current
+    one, along with the only links to the images they converted."""
+    for name in os.listdir(CONVERSION_CACHE_DIRECTORY):
+        folder = os.path.join(CONVERSION_CACHE_DIRECTORY, name)
+        if name.startswith('.') or folder == current_folder:
+            continue
+        try:
+            with open(os.path.join(
+                    folder, CONVERSION_SOURCE_NAME)) as source_file:
+                if source_file.read() != source:
+                    continue
+        except OSError:
+            continue
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def link_cached_images(cache_folder, destination_folder):
+    cached_img_folder = os.path.join(cache_folder, IMG_PATH)
+    for filename in os.listdir(cached_img_folder):
+        output.link_file(
+            os.path.join(cached_img_folder, filename),
+            os.path.join(destination_folder, filename))
+
+
+def convert_docx(
+        docx_path=SOURCE_DOCX_PATH, style_map_path=STYLE_MAP_PATH,
+        output_directory=OUTPUT_DIRECTORY):
+    """Converts the Word document to raw HTML without leaving Python.
+
+    Conversions are cached by a hash of the docx and the style map, so
+    rebuilding an unchanged document skips mammoth entirely and only links
+    the cached images into the output img folder. Each conversion is written
+    to a temporary folder and then renamed into the cache, so editions
+    building at the same time never see half of one. Only the latest
+    conversion of each docx and style map is kept.
+    """
+    with open(style_map_path, 'r') as style_map_file:
+        style_map = style_map_file.read()
+    cache_folder = os.path.join(
+        CONVERSION_CACHE_DIRECTORY, get_conversion_key(docx_path, style_map))
+    cached_html_path = os.path.join(cache_folder, 'index.html')
+    destination_folder = os.path.join(output_directory, IMG_PATH)
+    os.makedirs(destination_folder, exist_ok=True)
+    if not os.path.exists(cached_html_path):
+        os.makedirs(CONVERSION_CACHE_DIRECTORY, exist_ok=True)
+        temporary_folder = tempfile.mkdtemp(
+            dir=CONVERSION_CACHE_DIRECTORY, prefix='.converting-')
+        cached_img_folder = os.path.join(temporary_folder, IMG_PATH)
+        os.makedirs(cached_img_folder)
+        image_writer = ImageWriter(destination_folder, cached_img_folder)
+        with open(docx_path, 'rb') as docx_file:
+            result = mammoth.convert_to_html(
+                docx_file, style_map=style_map,
+                convert_image=mammoth.images.img_element(image_writer))
+        for message in result.messages:
+            print(message)
+        with open(os.path.join(temporary_folder, 'index.html'), 'w') as html:
+            html.write(result.value)
+        source = get_conversion_source(docx_path, style_map_path)
+        with open(os.path.join(
+                temporary_folder, CONVERSION_SOURCE_NAME), 'w') as source_file:
+            source_file.write(source)
+        try:
+            os.rename(temporary_folder, cache_folder)
+        except OSError:
+            # another edition finished converting the same document first
+            shutil.rmtree(temporary_folder)
+        else:
+            remove_older_conversions(source, cache_folder)
+        print('Converted {} with {} images'.format(
+            docx_path, len(image_writer.filenames)))
+    else:
+        print('Using cached conversion of {}'.format(docx_path))
+        link_cached_images(cache_folder, destination_folder)
+    with open(cached_html_path, 'r') as cached_html:
+        return cached_html.read()
+
+
+def read_raw_index(config):
+    move_img_files(config.output_dir)
+    with open(config.raw_index_path, 'r') as raw_html_input:
+        return raw_html_input.read()
+
+
 def adjust_all_img_src_paths(soup):
     for img in soup.find_all('img'):
         existing_src = img['src']
-        img['src'] = "/{}/{}".format(IMG_PATH, existing_src)
+        img['src'] = data.asset_url("{}/{}".format(IMG_PATH, existing_src))
 
 
 def save_image_file_table(content_items):
@@ -551,57 +821,346 @@ def link_toc_entries_to_matching_content(toc_listings, toc_targets):
                 link_listing_to_content(match, target)
 
 
-def run():
-    move_img_files()
-    with open(RAW_INDEX_PATH, 'r') as raw_html_input:
-        soup = BeautifulSoup(raw_html_input, 'html.parser')
-        adjust_all_img_src_paths(soup)
-        write_prettified_raw_index(soup)
-        footnote_index = extract_footnotes(soup)
-        chapters = parse_chapters(soup)
-        link_items = parse_toc_content(soup)
-        appendix_link_items = parse_appendix_toc_content(soup)
-        link_items += appendix_link_items
-        toc_entries = parse_toc_entries(soup)
-        appendix_toc_entries = parse_appendix_toc_entries(soup)
-        toc_entries += appendix_toc_entries
-        link_toc_entries_to_matching_content(toc_entries, link_items)
-        usable_links = [link for link in link_items if link.linked_entry]
-        sorted_toc_links = soup_sorted(usable_links)
-        extract_toc_entry_contents(sorted_toc_links, soup)
-        usable_sorted_toc_entries = soup_sorted(
-            [entry for entry in toc_entries if entry.content_link])
-
-        content_items = build_content_items(usable_sorted_toc_entries)
-        content_items = add_chapters_to_content_items(
-            content_items, chapters, soup)
-        link_parents_and_neighbors(content_items)
-        page_index = create_page_index(content_items)
-        update_contents(soup, content_items)
-
-        for content_item in content_items:
-            add_footnotes_to_article(soup, content_item, footnote_index)
-            extract_redundant_title_heading(content_item)
-            add_page_links_to_article(content_item)
-        write_to_json(content_items)
-        # save_image_file_table(content_items)
-        data.global_context.update(
-            chapters=[item for item in content_items if item.level == 0],
-            page_index=page_index)
-        for item in content_items:
-            item.write()
-            print(item.get_path())
-        splash_page = data.SplashPage(title='Home', level="splash")
-        splash_page.write()
-        print(splash_page.get_path())
-        search_page = data.SearchPage(title='Search', level="search")
-        search_page.write()
-        print(search_page.get_path())
-        page_index_page = data.PageIndexPage(
-            title='Page Index', level="page-index")
-        page_index_page.write()
-        print(page_index_page.get_path())
+def get_raw_html(config, from_raw_index=False):
+    if from_raw_index:
+        return read_raw_index(config)
+    return convert_docx(
+        config.source_docx, config.style_map, config.output_dir)
+
+
+def parse_content_items(raw_html, config):
+    soup = BeautifulSoup(raw_html, 'html.parser')
+    adjust_all_img_src_paths(soup)
+    write_prettified_raw_index(soup, config.nice_index_path)
+    footnote_index = extract_footnotes(soup)
+    chapters = parse_chapters(soup)
+    link_items = parse_toc_content(soup)
+    appendix_link_items = parse_appendix_toc_content(soup)
+    link_items += appendix_link_items
+    toc_entries = parse_toc_entries(soup)
+    appendix_toc_entries = parse_appendix_toc_entries(soup)
+    toc_entries += appendix_toc_entries
+    link_toc_entries_to_matching_content(toc_entries, link_items)
+    usable_links = [link for link in link_items if link.linked_entry]
+    sorted_toc_links = soup_sorted(usable_links)
+    extract_toc_entry_contents(sorted_toc_links, soup)
+    usable_sorted_toc_entries = soup_sorted(
+        [entry for entry in toc_entries if entry.content_link])
+
+    content_items = build_content_items(usable_sorted_toc_entries)
+    content_items = add_chapters_to_content_items(
+        content_items, chapters, soup)
+    link_parents_and_neighbors(content_items)
+    page_index = create_page_index(content_items)
+    update_contents(soup, content_items)
+
+    start = time.perf_counter()
+    post_process_content_items(content_items, footnote_index)
+    print('Post-processed {} articles in {:.2f}s'.format(
+        len(content_items), time.perf_counter() - start))
+    write_to_json(content_items, config.contents_json)
+    # save_image_file_table(content_items)
+    return content_items, page_index
+
+
+def build_pages(content_items, page_index):
+    data.fragment_cache.clear()
+    minify.stats.clear()
+    data.global_context.update(
+        chapters=[item for item in content_items if item.level == 0],
+        page_index=page_index)
+    return content_items + [
+        data.SplashPage(title='Home', level="splash"),
+        data.SearchPage(title='Search', level="search"),
+        data.PageIndexPage(title='Page Index', level="page-index"),
+    ]
+
+
+def write_pages(pages, writer):
+    for page in pages:
+        page.write(writer)
+        print(page.get_path())
+
+
+def inline_critical_css(pages, output_directory=OUTPUT_DIRECTORY):
+    stylesheet_path = os.path.join(output_directory, 'css', 'style.css')
+    if not os.path.exists(stylesheet_path):
+        print('{} not found, not inlining critical CSS'.format(
+            stylesheet_path))
+        return
+    with open(stylesheet_path, 'r') as stylesheet:
+        css = stylesheet.read()
+    prefix = data.global_context['prefix']
+    representatives = critical_css.find_representative_pages(pages)
+    data.global_context.update(critical_css={})
+    html_before = {
+        template_type: page.render()
+        for template_type, page in representatives.items()}
+    data.global_context.update(critical_css={
+        template_type: critical_css.extract_critical_css(css, html)
+        for template_type, html in html_before.items()})
+    print('Render-blocking bytes per page, before and after inlining '
+          'critical CSS:')
+    for template_type, page in sorted(representatives.items()):
+        before, _ = critical_css.measure_render_blocking(
+            html_before[template_type], output_directory, prefix)
+        after, external = critical_css.measure_render_blocking(
+            page.render(), output_directory, prefix)
+        print('{}: {} -> {} bytes, {} blocking requests to other '
+              'hosts'.format(template_type, before, after, external))
+
+
+def print_build_report():
+    print('Fragment cache hit rates:')
+    print(data.fragment_cache.report())
+    if data.MINIFY_HTML:
+        print('HTML minification:')
+        print(minify.stats.report())
+
+
+def fingerprint_assets(output_directory=OUTPUT_DIRECTORY):
+    asset_paths = list(assets.BUILT_ASSETS)
+    asset_paths.extend(assets.find_image_assets(output_directory))
+    manifest = assets.build_asset_manifest(output_directory, asset_paths)
+    data.global_context.update(asset_manifest=manifest)
+    print('Fingerprinted {} assets'.format(len(manifest)))
+
+
+def configure_context(config):
+    data.global_context.update(
+        prefix=config.prefix,
+        algolia_index_name=config.algolia_index_name,
+        asset_manifest={},
+        critical_css={})
+
+
+def build(config, writer, from_raw_index=False, optimize_assets=True):
+    raw_html = get_raw_html(config, from_raw_index)
+    assets.link_built_assets(config.output_dir)
+    if optimize_assets:
+        fingerprint_assets(config.output_dir)
+    content_items, page_index = parse_content_items(raw_html, config)
+    start = time.perf_counter()
+    related.link_related_articles(content_items)
+    print('Found related articles in {:.2f}s'.format(
+        time.perf_counter() - start))
+    pages = build_pages(content_items, page_index)
+    if optimize_assets:
+        inline_critical_css(pages, config.output_dir)
+    write_pages(pages, writer)
+    offline.write_offline_bundle(pages, config.output_dir)
+    return pages
+
+
+def run(
+        config=None, from_raw_index=False, optimize_assets=True,
+        check_links=True, strict_links=False, staged=True):
+    """Builds the site into a staging copy of the output directory, which
+    replaces the live one only if the whole build succeeds.
+
+    Unless `check_links` is off, a link that is broken and not listed in
+    known_broken_links.json fails the build, leaving the live one in place.
+    With `strict_links` the known broken links fail it too. With `staged`
+    off, as when watching, files are written straight into the output
+    directory and no deploy manifest is written.
+    """
+    config = config or BuildConfig()
+    configure_context(config)
+    data.precompile_templates()
+    with output.OutputWriter(
+            config.output_dir, staged=staged,
+            kept_pages=links.SKIPPED_PAGES) as writer:
+        pages = build(
+            config.in_directory(writer.root), writer, from_raw_index,
+            optimize_assets)
+        writer.finish_writes()
+        if check_links:
+            links.check_links(
+                writer.root, config.prefix,
+                known_broken=links.read_known_broken_links(),
+                strict=strict_links)
+    if staged:
+        deploy.write_deploy_manifest(config.output_dir)
+    print_build_report()
+    return pages
+
+
+def build_edition(
+        config, from_raw_index=False, check_links=True, strict_links=False):
+    run(config, from_raw_index, check_links=check_links,
+        strict_links=strict_links)
+    return config.name
+
+
+def run_editions(
+        configs, from_raw_index=False, check_links=True, strict_links=False):
+    """Builds several editions at once, each in its own process.
+
+    Templates are compiled into the shared bytecode cache before the
+    processes start, and editions made from the same document share its
+    cached conversion.
+    """
+    if len(configs) == 1:
+        run(configs[0], from_raw_index, check_links=check_links,
+            strict_links=strict_links)
+        return
+    data.precompile_templates()
+    with ProcessPoolExecutor(max_workers=len(configs)) as executor:
+        futures = [
+            executor.submit(
+                build_edition, config, from_raw_index, check_links,
+                strict_links)
+            for config in configs]
+        for future in futures:
+            print('Built edition {}'.format(future.result()))
+
+
+def get_watched_source_paths(config, from_raw_index=False):
+    if from_raw_index:
+        return [config.raw_index_path]
+    return [config.source_docx, config.style_map]
+
+
+def get_watched_paths(config, from_raw_index=False):
+    template_paths = [
+        os.path.join(data.TEMPLATE_FOLDER, name)
+        for name in data.env.list_templates(extensions=['jinja'])]
+    return get_watched_source_paths(config, from_raw_index) + template_paths
+
+
+def get_modification_times(paths):
+    times = {}
+    for path in paths:
+        try:
+            times[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return times
+
+
+def find_changed_paths(previous_times, current_times):
+    all_paths = set(previous_times) | set(current_times)
+    return {
+        path for path in all_paths
+        if previous_times.get(path) != current_times.get(path)}
+
+
+def find_pages_using_templates(pages, template_names):
+    dependencies = {}
+    affected_pages = []
+    for page in pages:
+        if page.template not in dependencies:
+            dependencies[page.template] = data.get_template_dependencies(
+                page.template)
+        if dependencies[page.template] & template_names:
+            affected_pages.append(page)
+    return affected_pages
+
+
+def reload_browsers():
+    try:
+        urlopen(BROWSER_SYNC_RELOAD_URL, timeout=1).close()
+    except OSError:
+        # browser-sync is not running, so there is nothing to reload
+        pass
+
+
+def watch(config=None, from_raw_index=False):
+    """Rebuilds the site whenever a source file or template changes.
+
+    The parsed content items stay in memory between changes. A template
+    change only rerenders the pages whose templates extend or include it,
+    while a change to the source document or stylemap rebuilds everything
+    starting from the conversion, written straight into the output
+    directory without a deploy manifest. Assets are not fingerprinted and no
+    critical CSS is inlined, so pages use the stylesheet gulp rebuilds.
+    Links are not checked.
+    """
+    config = config or BuildConfig()
+    pages = run(
+        config, from_raw_index, optimize_assets=False, check_links=False)
+    source_paths = set(get_watched_source_paths(config, from_raw_index))
+    modification_times = get_modification_times(
+        get_watched_paths(config, from_raw_index))
+    print('Watching {} for changes'.format(
+        ', '.join(sorted(modification_times))))
+    while True:
+        time.sleep(WATCH_POLL_INTERVAL)
+        current_times = get_modification_times(
+            get_watched_paths(config, from_raw_index))
+        changed_paths = find_changed_paths(modification_times, current_times)
+        if not changed_paths:
+            continue
+        modification_times = current_times
+        start = time.perf_counter()
+        try:
+            if changed_paths & source_paths:
+                pages = run(
+                    config, from_raw_index, optimize_assets=False,
+                    check_links=False, staged=False)
+                rebuilt_pages = pages
+            else:
+                template_names = {
+                    os.path.relpath(path, data.TEMPLATE_FOLDER)
+                    for path in changed_paths}
+                rebuilt_pages = find_pages_using_templates(
+                    pages, template_names)
+                data.fragment_cache.clear()
+                minify.stats.clear()
+                with output.OutputWriter(
+                        config.output_dir, staged=False) as writer:
+                    write_pages(rebuilt_pages, writer)
+                offline.write_offline_bundle(pages, config.output_dir)
+                print_build_report()
+        except Exception as error:
+            print('Rebuild failed: {!r}'.format(error))
+            continue
+        elapsed = time.perf_counter() - start
+        print('Rebuilt {} pages in {:.2f}s after changes to {}'.format(
+            len(rebuilt_pages), elapsed, ', '.join(sorted(changed_paths))))
+        reload_browsers()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Convert the Roadmap to Reentry into HTML pages.')
+    parser.add_argument(
+        '--raw-index', action='store_true',
+        help='parse {} from the mammoth command line tool instead of '
+             'converting {}'.format(RAW_INDEX_PATH, SOURCE_DOCX_PATH))
+    parser.add_argument(
+        '--watch', action='store_true',
+        help='keep running and rebuild the pages affected by each change '
+             'to the templates or the source')
+    parser.add_argument(
+        '--skip-link-check', action='store_true',
+        help='do not check the links of the build')
+    parser.add_argument(
+        '--strict-links', action='store_true',
+        help='also fail the build on the broken links listed in {}'.format(
+            links.KNOWN_BROKEN_LINKS_PATH))
+    parser.add_argument(
+        '--editions', metavar='PATH',
+        help='build every edition listed in this JSON file at once')
+    parser.add_argument(
+        '--edition', metavar='NAME',
+        help='with --editions and --watch, the edition to watch '
+             '(the first one by default)')
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    run()
+    args = parse_args()
+    if args.editions:
+        editions = load_editions(args.editions)
+    else:
+        editions = [BuildConfig()]
+    if args.watch:
+        watch(
+            find_edition(editions, args.edition),
+            from_raw_index=args.raw_index)
+    else:
+        run_editions(
+            editions, from_raw_index=args.raw_index,
+            check_links=not args.skip_link_check,
+            strict_links=args.strict_links)
@@ -0,0 +1,87 @@
+import re
+from collections import defaultdict
+
+
+# matches comments, elements whose text must be kept as is, and tags
+TOKEN_PATTERN = re.compile(
+    r'<!--.*?-->'
+    r'|<(pre|textarea|script|style)\b.*?</\1\s*>'
+    r'|<[^>]*>',
+    re.DOTALL | re.IGNORECASE)
+# HTML's ASCII whitespace; `\s` would also match no-break spaces, which are
+# part of the visible text
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r\f]+')
+
+
+def collapse_whitespace(match):
+    return '\n' if '\n' in match.group(0) else ' '
+
+
+def minify_html(html):
+    """Collapses each run of whitespace in text to one character and drops
+    comments.
+
+    Browsers render a run of whitespace the same way as a single space, so
+    the page looks the same. Tags, conditional comments and the contents of
+    `pre`, `textarea`, `script` and `style` elements are kept as they are.
+    Whitespace is never removed entirely, because it is significant between
+    inline and inline-block elements.
+    """
+    chunks = []
+    text = ''
+    position = 0
+    for match in TOKEN_PATTERN.finditer(html):
+        # text on both sides of a dropped comment is collapsed together
+        text += html[position:match.start()]
+        position = match.end()
+        token = match.group(0)
+        if token.startswith('<!--') and not token.startswith('<!--[if'):
+            continue
+        chunks.append(WHITESPACE_PATTERN.sub(collapse_whitespace, text))
+        chunks.append(token)
+        text = ''
+    text += html[position:]
+    chunks.append(WHITESPACE_PATTERN.sub(collapse_whitespace, text))
+    return ''.join(chunks)
+
+
+class MinificationStats:
+    """Tallies the bytes saved by minification for each type of page, as
+    pages are rendered in the main process."""
+
+    def __init__(self):
+        self.pages = defaultdict(int)
+        self.original_bytes = defaultdict(int)
+        self.minified_bytes = defaultdict(int)
+
+    def record(self, page_type, original_size, minified_size):
+        self.pages[page_type] += 1
+        self.original_bytes[page_type] += original_size
+        self.minified_bytes[page_type] += minified_size
+
+    def clear(self):
+        self.pages.clear()
+        self.original_bytes.clear()
+        self.minified_bytes.clear()
+
+    def report(self):
+        lines = []
+        for page_type in sorted(self.pages):
+            pages = self.pages[page_type]
+            original = self.original_bytes[page_type]
+            saved = original - self.minified_bytes[page_type]
+            lines.append(
+                '{}: {} pages, {} bytes saved per page ({:.0%})'.format(
+                    page_type, pages, saved // pages,
+                    saved / original if original else 0))
+        return '\n'.join(lines)
+
+
+stats = MinificationStats()
+
+
+def minify_page(html, page_type):
+    minified = minify_html(html)
+    stats.record(
+        page_type, len(html.encode('utf-8')), len(minified.encode('utf-8')))
+    return minified
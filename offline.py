@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+
+import data
+import output
+
+
+PRECACHE_MANIFEST_NAME = 'precache-manifest.json'
+SERVICE_WORKER_NAME = 'service-worker.js'
+SERVICE_WORKER_TEMPLATE = 'service_worker.jinja'
+SHELL_ASSETS = ('css/style.css', 'js/index.js')
+
+
+def get_page_url(page):
+    path = page.get_path()
+    if not path:
+        return '{}/'.format(data.global_context['prefix'])
+    return '{}/{}/'.format(data.global_context['prefix'], path)
+
+
+def iter_descendants(item):
+    items_to_visit = [item]
+    while items_to_visit:
+        next_item = items_to_visit.pop()
+        yield next_item
+        items_to_visit.extend(reversed(next_item.children))
+
+
+def get_image_urls(item):
+    if not item.contents:
+        return []
+    return [src for src, _ in item.contents.images]
+
+
+def get_chapter_bundle(chapter):
+    pages = {}
+    images = []
+    for item in iter_descendants(chapter):
+        if item.content_hash:
+            pages[get_page_url(item)] = item.content_hash
+        for url in get_image_urls(item):
+            if url not in images:
+                images.append(url)
+    return dict(title=chapter.title, pages=pages, assets=images)
+
+
+def get_fingerprinted_urls():
+    return sorted(
+        '{}/{}'.format(data.global_context['prefix'], fingerprinted_path)
+        for fingerprinted_path in
+        data.global_context['asset_manifest'].values())
+
+
+def build_precache_manifest(pages):
+    """Groups the written pages by chapter for the service worker.
+
+    Each chapter lists its pages with the content hash computed when they
+    were written, so the service worker can fetch only the pages that
+    changed between deploys, plus the images those pages show. The shell
+    is what every page needs: the home page, the stylesheet and the script.
+    """
+    chapters = {}
+    shell = [data.asset_url(asset_path) for asset_path in SHELL_ASSETS]
+    for page in pages:
+        if isinstance(page, data.ChapterIndex):
+            chapters[page.get_slug()] = get_chapter_bundle(page)
+        elif isinstance(page, data.SplashPage):
+            shell.insert(0, get_page_url(page))
+    manifest = dict(shell=shell, chapters=chapters)
+    manifest['version'] = hashlib.sha256(
+        json.dumps(manifest, sort_keys=True).encode('utf-8')
+    ).hexdigest()[:16]
+    return manifest
+
+
+def write_offline_bundle(pages, output_dir=data.OUTPUT_DIR):
+    manifest = build_precache_manifest(pages)
+    output.write_file(
+        os.path.join(output_dir, PRECACHE_MANIFEST_NAME),
+        json.dumps(manifest, indent=2, sort_keys=True))
+    # the worker embeds the manifest version, so browsers see a new worker
+    # after each deploy that changed a page
+    template = data.env.get_template(SERVICE_WORKER_TEMPLATE)
+    output.write_file(
+        os.path.join(output_dir, SERVICE_WORKER_NAME),
+        template.render(
+            prefix=data.global_context['prefix'],
+            fingerprinted_urls=get_fingerprinted_urls(),
+            version=manifest['version'],
+            manifest_name=PRECACHE_MANIFEST_NAME))
+    print('Precache manifest written for {} chapters'.format(
+        len(manifest['chapters'])))
+    return manifest
@@ -0,0 +1,239 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+STAGING_SUFFIX = '.staging'
+PREVIOUS_SUFFIX = '.previous'
+WRITE_WORKERS = 8
+# rendered pages the build did not write are stale; other files, such as
+# images and bundles, carry over from the live tree
+PAGE_EXTENSION = '.html'
+
+
+def write_file(path, content):
+    """Replaces the file at `path` by renaming a new file over it.
+
+    The old file is never written to, so other hard links to it, such as
+    the live copy of a file in the staging tree, keep their contents.
+    `content` is text, bytes, or a binary file object to stream from.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    folder = os.path.dirname(path)
+    os.makedirs(folder or '.', exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(
+        dir=folder or '.', prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as output_file:
+            if hasattr(content, 'read'):
+                shutil.copyfileobj(content, output_file)
+            else:
+                output_file.write(content)
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def link_file(source_path, destination_path):
+    """Hard-links a file into place, replacing any file already there, or
+    copies it when the two paths are on different file systems."""
+    if os.path.exists(destination_path) and \
+            os.path.samefile(source_path, destination_path):
+        return
+    folder = os.path.dirname(destination_path)
+    os.makedirs(folder or '.', exist_ok=True)
+    temporary_path = os.path.join(folder, '.{}.{}.{}.tmp'.format(
+        os.path.basename(destination_path), os.getpid(),
+        threading.get_ident()))
+    try:
+        os.link(source_path, temporary_path)
+    except OSError:
+        with open(source_path, 'rb') as source_file:
+            write_file(destination_path, source_file)
+        return
+    os.replace(temporary_path, destination_path)
+
+
+def remove_empty_folders(folder, root):
+    """Removes `folder` and its parents up to `root` while they are
+    empty."""
+    root = os.path.abspath(root)
+    folder = os.path.abspath(folder)
+    while folder != root and folder.startswith(root + os.sep):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            return
+        folder = os.path.dirname(folder)
+
+
+def has_content(path, content):
+    try:
+        if os.path.getsize(path) != len(content):
+            return False
+        with open(path, 'rb') as existing_file:
+            return existing_file.read() == content
+    except OSError:
+        return False
+
+
+def link_tree(source, destination):
+    # hard links make the copy nearly free; files are only ever replaced
+    shutil.copytree(source, destination, copy_function=os.link)
+
+
+class OutputWriter:
+    """Writes the built site into a staging copy of the output directory
+    and swaps it into place once the whole build has succeeded.
+
+    Files are written by a pool of threads, and files whose contents did
+    not change are left alone. Pages carried over from the live tree that
+    the build did not write are removed, except for `kept_pages`. A build that fails or is interrupted before
+    the swap leaves the live tree untouched. The swap itself is not atomic:
+    it renames the live directory aside and then renames the staging
+    directory into its place, so the output directory is briefly missing.
+    If the process dies between the two renames, it stays missing until the
+    next build moves the previous tree back. With `staged=False` files are
+    written straight into the output directory, which suits rebuilding a
+    few pages while watching.
+    """
+
+    def __init__(
+            self, output_dir, staged=True, workers=WRITE_WORKERS,
+            kept_pages=()):
+        self.output_dir = os.path.normpath(output_dir)
+        self.staged = staged
+        self.kept_pages = set(kept_pages)
+        self.staging_dir = self.output_dir + STAGING_SUFFIX
+        self.previous_dir = self.output_dir + PREVIOUS_SUFFIX
+        self.root = self.staging_dir if staged else self.output_dir
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.executor = None
+        self.futures = []
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+    def begin(self):
+        self.written = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.bytes_written = 0
+        self.written_paths = set()
+        self.first_write = None
+        self.seconds = None
+        if self.staged:
+            self.recover_interrupted_swap()
+            if os.path.exists(self.staging_dir):
+                shutil.rmtree(self.staging_dir)
+            if os.path.exists(self.output_dir):
+                link_tree(self.output_dir, self.staging_dir)
+            else:
+                os.makedirs(self.staging_dir)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.futures = []
+
+    def recover_interrupted_swap(self):
+        if not os.path.exists(self.previous_dir):
+            return
+        if os.path.exists(self.output_dir):
+            shutil.rmtree(self.previous_dir)
+        else:
+            os.rename(self.previous_dir, self.output_dir)
+
+    def write(self, relative_path, content):
+        """Queues `content` to be written to `relative_path` in the output."""
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        self.written_paths.add(
+            os.path.normpath(relative_path).replace(os.sep, '/'))
+        self.futures.append(self.executor.submit(
+            self.write_now, os.path.join(self.root, relative_path), content))
+
+    def write_now(self, path, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        if has_content(path, content):
+            with self.lock:
+                self.unchanged += 1
+            return
+        write_file(path, content)
+        with self.lock:
+            self.written += 1
+            self.bytes_written += len(content)
+
+    def finish_writes(self):
+        """Waits for every queued file and removes stale pages, so the
+        output can be inspected before it is committed."""
+        if not self.futures and self.seconds is not None:
+            return
+        self.executor.shutdown()
+        self.seconds = time.perf_counter() - (
+            self.first_write or time.perf_counter())
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+        if self.staged:
+            self.remove_stale_pages()
+
+    def remove_stale_pages(self):
+        kept_paths = self.written_paths | self.kept_pages
+        for folder, _, filenames in os.walk(self.staging_dir):
+            for filename in filenames:
+                path = os.path.join(folder, filename)
+                relative_path = os.path.relpath(
+                    path, self.staging_dir).replace(os.sep, '/')
+                if filename.endswith(PAGE_EXTENSION) and \
+                        relative_path not in kept_paths:
+                    os.remove(path)
+                    remove_empty_folders(folder, self.staging_dir)
+                    self.removed += 1
+
+    def commit(self):
+        try:
+            self.finish_writes()
+        except BaseException:
+            self.discard()
+            raise
+        if self.staged:
+            self.swap()
+        self.report()
+
+    def discard(self):
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown()
+        self.futures = []
+        if self.staged and os.path.exists(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+            print('Build failed, left {} unchanged'.format(self.output_dir))
+
+    def swap(self):
+        if os.path.exists(self.output_dir):
+            os.rename(self.output_dir, self.previous_dir)
+        os.rename(self.staging_dir, self.output_dir)
+        shutil.rmtree(self.previous_dir, ignore_errors=True)
+
+    def report(self):
+        # from the first queued file, so it overlaps the rendering of pages
+        megabytes = self.bytes_written / 1e6
+        print('Wrote {} files ({:.1f} MB) in {:.2f}s, {:.1f} MB/s, '
+              '{} unchanged, {} removed'.format(
+                  self.written, megabytes, self.seconds,
+                  megabytes / self.seconds if self.seconds else 0,
+                  self.unchanged, self.removed))
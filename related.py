@@ -0,0 +1,108 @@
+import re
+import math
+from collections import Counter
+
+import numpy as np
+
+
+RELATED_ARTICLE_COUNT = 5
+MAX_VOCABULARY_SIZE = 5000
+MIN_DOCUMENT_FREQUENCY = 2
+# terms in more than this share of articles say little about any of them
+MAX_DOCUMENT_SHARE = 0.5
+BLOCK_SIZE = 256
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z']+")
+STOP_WORDS = frozenset("""
+    a about after all also an and any are as at be because been before being
+    but by can could did do does for from had has have how i if in into is it
+    its may more must my no not of on or other our out should so some such
+    than that the their them then there these they this those to under up
+    was we were what when where which while who will with would you your
+    """.split())
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOP_WORDS]
+
+
+def build_vocabulary(token_lists):
+    document_frequency = Counter()
+    for tokens in token_lists:
+        document_frequency.update(set(tokens))
+    max_frequency = max(
+        MIN_DOCUMENT_FREQUENCY, MAX_DOCUMENT_SHARE * len(token_lists))
+    terms = [
+        term for term, frequency in document_frequency.most_common()
+        if MIN_DOCUMENT_FREQUENCY <= frequency <= max_frequency
+    ][:MAX_VOCABULARY_SIZE]
+    vocabulary = {term: column for column, term in enumerate(terms)}
+    frequencies = np.array(
+        [document_frequency[term] for term in terms], dtype=np.float32)
+    return vocabulary, frequencies
+
+
+def build_tfidf_matrix(token_lists):
+    """Returns one row per document of L2-normalized TF-IDF weights, with
+    sublinear term frequencies."""
+    vocabulary, frequencies = build_vocabulary(token_lists)
+    matrix = np.zeros((len(token_lists), len(vocabulary)), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        for term, count in Counter(tokens).items():
+            column = vocabulary.get(term)
+            if column is not None:
+                matrix[row, column] = 1 + math.log(count)
+    matrix *= np.log((1 + len(token_lists)) / (1 + frequencies)) + 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
+
+
+def find_most_similar(matrix, groups, count, block_size=BLOCK_SIZE):
+    """Returns, for each row, the indices of the `count` most similar rows in
+    other groups, most similar first.
+
+    Similarities are computed one block of rows at a time, so memory grows
+    with `block_size` times the number of rows instead of its square.
+    """
+    groups = np.asarray(groups)
+    total = matrix.shape[0]
+    count = min(count, total)
+    results = []
+    for start in range(0, total, block_size):
+        block = matrix[start:start + block_size]
+        similarities = block.dot(matrix.T)
+        same_group = groups[start:start + block_size, None] == groups[None, :]
+        similarities[same_group] = 0
+        rows = np.arange(similarities.shape[0])[:, None]
+        candidates = np.argpartition(-similarities, count - 1, axis=1)
+        candidates = candidates[:, :count]
+        order = np.argsort(-similarities[rows, candidates], axis=1)
+        candidates = candidates[rows, order]
+        for row, indices in enumerate(candidates):
+            results.append([
+                int(index) for index in indices
+                if similarities[row, index] > 0])
+    return results
+
+
+def link_related_articles(content_items, count=RELATED_ARTICLE_COUNT):
+    """Sets `related` on each article to the most similar articles in other
+    chapters, by the TF-IDF cosine similarity of their titles and text."""
+    articles = [item for item in content_items if item.level != 0]
+    if not articles:
+        return
+    token_lists = [
+        tokenize(article.title + '\n' + article.text())
+        for article in articles]
+    chapters = {}
+    groups = [
+        chapters.setdefault(article.get_chapter(), len(chapters))
+        for article in articles]
+    matrix = build_tfidf_matrix(token_lists)
+    for article, indices in zip(
+            articles, find_most_similar(matrix, groups, count)):
+        article.related = [articles[index] for index in indices]
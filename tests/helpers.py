@@ -0,0 +1,10 @@
+import os
+
+
+def write_files(root, files):
+    """Writes each text in `files` to its relative path under `root`."""
+    for relative_path, text in files.items():
+        path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as output_file:
+            output_file.write(text)
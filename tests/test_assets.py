@@ -0,0 +1,46 @@
+import os
+import json
+import tempfile
+from unittest import TestCase
+
+import assets
+import data
+from tests.helpers import write_files
+
+
+class TestAssets(TestCase):
+
+    def test_build_asset_manifest(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            write_files(output_dir, {
+                'css/style.css': 'body { color: red; }', 'img/1.png': 'png'})
+            asset_paths = ['css/style.css', 'js/index.js'] + \
+                assets.find_image_assets(output_dir)
+            first = assets.build_asset_manifest(output_dir, asset_paths)
+            write_files(output_dir, {'css/style.css': 'body { color: blue; }'})
+            second = assets.build_asset_manifest(output_dir, asset_paths)
+
+            self.assertEqual(set(second), {'css/style.css', 'img/1.png'})
+            self.assertRegex(second['css/style.css'], r'^css/style\.\w{10}\.css$')
+            self.assertNotEqual(first['css/style.css'], second['css/style.css'])
+            self.assertEqual(first['img/1.png'], second['img/1.png'])
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(output_dir, 'css'))),
+                sorted(['style.css', os.path.basename(second['css/style.css'])]))
+            self.assertEqual(assets.find_image_assets(output_dir), ['img/1.png'])
+            self.assertTrue(os.path.samefile(
+                os.path.join(output_dir, 'img/1.png'),
+                os.path.join(output_dir, second['img/1.png'])))
+            with open(os.path.join(output_dir, 'asset-manifest.json')) as f:
+                self.assertEqual(json.load(f), second)
+
+    def test_asset_url(self):
+        manifest = {'css/style.css': 'css/style.0123456789.css'}
+        original_manifest = data.global_context['asset_manifest']
+        data.global_context['asset_manifest'] = manifest
+        try:
+            self.assertEqual(
+                data.asset_url('css/style.css'), '/css/style.0123456789.css')
+            self.assertEqual(data.asset_url('js/index.js'), '/js/index.js')
+        finally:
+            data.global_context['asset_manifest'] = original_manifest
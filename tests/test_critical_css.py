@@ -0,0 +1,51 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import critical_css
+
+
+STYLESHEET = '''@charset "UTF-8";
+/* LAYOUT */
+header { background-color: #e2c221;
+  padding: 1em 0; }
+footer { padding: 2em 0; }
+a:focus, .unused { outline: 3px solid #2921e2; }
+@media screen and (max-width: 500px) {
+  header, footer { padding-left: 1rem; }
+  .unused { display: none; } }
+@keyframes spin { from { top: 0; } to { top: 1em; } }
+'''
+
+PAGE = '''<html><head></head><body>
+<header><a href="/">Roadmap to Reentry</a></header>
+<footer>Root &amp; Rebound</footer>
+</body></html>'''
+
+
+class TestCriticalCSS(TestCase):
+
+    def test_extract_critical_css(self):
+        self.assertEqual(
+            critical_css.extract_critical_css(STYLESHEET, PAGE),
+            'header{background-color: #e2c221; padding: 1em 0;}'
+            'a:focus, .unused{outline: 3px solid #2921e2;}'
+            '@media screen and (max-width: 500px){'
+            'header, footer{padding-left: 1rem;}}')
+
+    def test_measure_render_blocking(self):
+        html = '''<head>
+        <style>header{color: red;}</style>
+        <link rel="stylesheet" href="/css/style.css">
+        <link rel="preload" as="style" href="/css/other.css">
+        <noscript><link rel="stylesheet" href="/css/style.css"></noscript>
+        <script src="//unpkg.com/jquery@3.1.1"></script>
+        <script defer src="/js/index.js"></script>
+        </head>'''
+        with tempfile.TemporaryDirectory() as output_dir:
+            os.makedirs(os.path.join(output_dir, 'css'))
+            with open(os.path.join(output_dir, 'css', 'style.css'), 'w') as f:
+                f.write('x' * 100)
+            self.assertEqual(
+                critical_css.measure_render_blocking(html, output_dir),
+                (len('header{color: red;}') + 100, 1))
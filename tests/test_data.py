@@ -1,6 +1,9 @@
 from unittest import TestCase
 from unittest.mock import MagicMock
 
+from bs4 import BeautifulSoup
+from markupsafe import Markup
+
 import data
 
 
@@ -21,3 +24,61 @@ class TestAppendixTOCEntry(TestCase):
                 self.assertEqual(mock_self.text, 'Fee Waiver—California')
                 self.assertEqual(mock_self.page_number, 78)
 
+
+
+class TestTemplateDependencies(TestCase):
+
+    def test_get_template_dependencies(self):
+        dependencies = data.get_template_dependencies('page_index.jinja')
+        self.assertIn('base.jinja', dependencies)
+        self.assertIn('breadcrumbs.jinja', dependencies)
+        self.assertIn('breadcrumb_ancestors.jinja', dependencies)
+        self.assertNotIn('splash_page.jinja', dependencies)
+
+
+class TestFragmentCache(TestCase):
+
+    def test_reuses_fragments_and_evicts_least_recently_used(self):
+        cache = data.FragmentCache(max_size=2)
+        render = MagicMock(side_effect=lambda: 'fragment')
+        cache.get('nav.jinja', ('a',), render)
+        cache.get('nav.jinja', ('b',), render)
+        cache.get('nav.jinja', ('a',), render)
+        cache.get('nav.jinja', ('c',), render)
+        self.assertEqual(render.call_count, 3)
+        self.assertIn(('nav.jinja', ('a',)), cache.fragments)
+        self.assertNotIn(('nav.jinja', ('b',)), cache.fragments)
+        self.assertEqual(cache.hits['nav.jinja'], 1)
+        self.assertEqual(
+            cache.report(), 'nav.jinja: 1 of 4 renders cached (25%)')
+
+
+class TestArticleContents(TestCase):
+
+    def setUp(self):
+        soup = BeautifulSoup(
+            '<h3>Renting</h3>'
+            '<p>Rent<sup><a href="#footnote-4" id="footnote-ref-4">[4]</a>'
+            '</sup> is due.</p>'
+            '<p><img src="/img/1.png" alt="Lease"/></p>',
+            'html.parser')
+        # pages links are added by wrapping each tag in its own document
+        nodes = [BeautifulSoup(str(tag), 'html.parser') for tag in soup]
+        self.contents = data.ArticleContents.from_nodes(nodes)
+
+    def test_derived_fields(self):
+        self.assertEqual(self.contents.headings, ['Renting'])
+        self.assertEqual(self.contents.text, 'Renting\nRent[4] is due.\n')
+        self.assertEqual(self.contents.images, [('/img/1.png', 'Lease')])
+
+    def test_article_lookups(self):
+        article = data.SingleArticle(
+            title='Renting', level=4, page_number=12, contents=self.contents)
+        self.assertEqual(article.heading_text(), 'Renting')
+        self.assertTrue(article.has_img_tags())
+        self.assertEqual(list(article.get_img_tags()), [(
+            'http://roadmap.rootandrebound.org/renting/', '12 - ',
+            'Renting', '/img/1.png', 'Lease')])
+
+    def test_renders_as_html(self):
+        self.assertEqual(str(Markup(self.contents)), self.contents.html)
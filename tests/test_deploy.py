@@ -0,0 +1,105 @@
+import os
+import subprocess
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import deploy
+from tests.helpers import write_files
+
+
+class TestDeploy(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.tmp.name, 'site')
+        state_patch = patch.object(
+            deploy, 'DEPLOY_STATE_DIRECTORY',
+            os.path.join(self.tmp.name, 'state'))
+        state_patch.start()
+        self.addCleanup(state_patch.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_site(self, files):
+        write_files(self.output_dir, files)
+
+    def update_site(self):
+        self.write_site({'index.html': 'new home', 'jobs/index.html': 'jobs'})
+        os.remove(os.path.join(self.output_dir, 'housing', 'index.html'))
+
+    def test_build_deploy_manifest(self):
+        manifest = deploy.build_deploy_manifest(
+            {'index.html': 'b', 'jobs/index.html': 'c', 'css/style.css': 'd'},
+            {'index.html': 'a', 'housing/index.html': 'e',
+             'css/style.css': 'd'})
+        self.assertEqual(manifest, dict(
+            added={'jobs/index.html': 'c'},
+            changed={'index.html': 'b'},
+            deleted=['housing/index.html'],
+            unchanged=1))
+
+    def test_hash_git_blob_matches_git(self):
+        self.write_site({'index.html': 'home'})
+        path = os.path.join(self.output_dir, 'index.html')
+        git_hash = subprocess.check_output(
+            ['git', 'hash-object', path], universal_newlines=True).strip()
+        self.assertEqual(deploy.hash_git_blob(path), git_hash)
+
+    def test_publish_to_directory_syncs_only_changes(self):
+        target = os.path.join(self.tmp.name, 'target')
+        self.write_site({
+            'index.html': 'home', 'housing/index.html': 'housing',
+            'raw_index.html': 'raw'})
+        manifest = deploy.publish(target, self.output_dir)
+        self.assertEqual(len(manifest['added']), 2)
+        self.assertFalse(
+            os.path.exists(os.path.join(target, 'raw_index.html')))
+        self.update_site()
+        self.assertEqual(
+            deploy.describe_manifest(
+                deploy.write_deploy_manifest(self.output_dir)),
+            '1 added, 1 changed, 1 deleted, 0 unchanged')
+        deploy.publish(target, self.output_dir)
+        self.assertEqual(deploy.hash_output(target), deploy.hash_output(
+            self.output_dir))
+        self.assertFalse(os.path.exists(os.path.join(target, 'housing')))
+        manifest = deploy.publish(target, self.output_dir)
+        self.assertEqual(
+            deploy.describe_manifest(manifest),
+            '0 added, 0 changed, 0 deleted, 2 unchanged')
+
+    def test_publish_to_new_directory_copies_everything(self):
+        self.write_site({'index.html': 'home', 'housing/index.html': 'x'})
+        deploy.publish(os.path.join(self.tmp.name, 'a'), self.output_dir)
+        other_target = os.path.join(self.tmp.name, 'b')
+        manifest = deploy.publish(other_target, self.output_dir)
+        self.assertEqual(
+            deploy.describe_manifest(manifest),
+            '2 added, 0 changed, 0 deleted, 0 unchanged')
+        self.assertEqual(
+            deploy.hash_output(other_target),
+            deploy.hash_output(self.output_dir))
+
+    def test_publish_to_bare_git_repo(self):
+        target = os.path.join(self.tmp.name, 'site.git')
+        subprocess.check_call(
+            ['git', 'init', '-q', '--bare', target])
+        self.write_site({'index.html': 'home', 'housing/index.html': 'x'})
+        env = dict(
+            os.environ, GIT_AUTHOR_NAME='Roadmap', GIT_COMMITTER_NAME='Roadmap',
+            GIT_AUTHOR_EMAIL='roadmap@example.org',
+            GIT_COMMITTER_EMAIL='roadmap@example.org')
+        with patch.dict(os.environ, env):
+            deploy.publish(target, self.output_dir)
+            self.update_site()
+            manifest = deploy.publish(target, self.output_dir)
+        self.assertEqual(
+            deploy.describe_manifest(manifest),
+            '1 added, 1 changed, 1 deleted, 0 unchanged')
+        self.assertEqual(
+            deploy.read_git_state(target, deploy.DEFAULT_BRANCH),
+            deploy.hash_output(self.output_dir))
+        log = subprocess.check_output(
+            ['git', '--git-dir', target, 'log', '--format=%s',
+             deploy.DEFAULT_BRANCH], universal_newlines=True)
+        self.assertEqual(len(log.splitlines()), 2)
@@ -0,0 +1,86 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import links
+from tests.helpers import write_files
+
+
+class TestLinks(TestCase):
+
+    def test_resolve_link(self):
+        page = 'housing/renting/index.html'
+        self.assertEqual(
+            links.resolve_link('/2019/', page, '/2019'), ('index.html', ''))
+        self.assertEqual(
+            links.resolve_link('/2019/housing', page, '/2019'),
+            ('housing', ''))
+        self.assertEqual(
+            links.resolve_link('/2019/page-index/#page_12', page, '/2019'),
+            ('page-index/index.html', 'page_12'))
+        self.assertEqual(
+            links.resolve_link('#footnote-1', page), (page, 'footnote-1'))
+        self.assertEqual(
+            links.resolve_link('../', page), ('housing/index.html', ''))
+        self.assertIsNone(links.resolve_link('/other-site/', page, '/2019'))
+        self.assertIsNone(links.resolve_link('https://example.org/', page))
+        self.assertIsNone(links.resolve_link('//unpkg.com/jquery', page))
+        self.assertIsNone(links.resolve_link('mailto:roadmap@example', page))
+
+    def test_check_links(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            write_files(output_dir, {
+                'index.html':
+                    '<a href="/housing">Housing</a>'
+                    '<a href="https://example.org/">Elsewhere</a>'
+                    '<img src="/img/1.png">',
+                'housing/index.html':
+                    '<a href="/">Home</a>'
+                    '<a class="page_link" href="/page-index/#page_12">PG. 12'
+                    '</a><sup id="footnote-1">1</sup>'
+                    '<a href="#footnote-1">[1]</a>',
+                'page-index/index.html': '<li id="page_12">12</li>',
+                'img/1.png': 'png',
+                'raw_index.html': '<a href="/missing/">skipped</a>',
+            })
+            self.assertEqual(links.check_links(output_dir, workers=2), [])
+            write_files(output_dir, {
+                'jobs/index.html':
+                    '<a href="/housing/renting/">Renting</a>'
+                    '<a href="/page-index/#page_13">PG. 13</a>'
+                    "<img src='/img/2.png'>",
+            })
+            with self.assertRaises(links.BrokenLinksError) as raised:
+                links.check_links(output_dir, workers=1)
+            known_broken = {
+                'jobs/index.html -> housing/renting/index.html',
+                'jobs/index.html -> page-index/index.html#page_13'}
+            with self.assertRaises(links.BrokenLinksError) as raised_new:
+                links.check_links(
+                    output_dir, workers=1, known_broken=known_broken)
+            known_broken.add('jobs/index.html -> img/2.png')
+            self.assertEqual(len(links.check_links(
+                output_dir, workers=1, known_broken=known_broken)), 3)
+            with self.assertRaises(links.BrokenLinksError):
+                links.check_links(
+                    output_dir, workers=1, known_broken=known_broken,
+                    strict=True)
+        self.assertEqual(str(raised.exception), '3 of 9 links are broken')
+        self.assertEqual(str(raised_new.exception), '1 of 9 links are broken')
+
+    def test_get_link_key_drops_the_prefix(self):
+        self.assertEqual(
+            links.get_link_key(
+                'jobs/index.html', '/2019/page-index/#page_13', '/2019'),
+            links.get_link_key('jobs/index.html', '/page-index/#page_13'))
+
+    def test_find_broken_links_reports_reasons(self):
+        pages = {
+            'index.html': (set(), ['/housing/#renting', '/jobs/']),
+            'housing/index.html': ({'buying'}, []),
+        }
+        files = set(pages)
+        self.assertEqual(links.find_broken_links(pages, files), [
+            ('index.html', '/housing/#renting', 'missing anchor'),
+            ('index.html', '/jobs/', 'missing file'),
+        ])
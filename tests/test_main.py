@@ -1,5 +1,9 @@
+import io
+import os
+import json
+import tempfile
 from unittest import TestCase
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 from bs4 import BeautifulSoup
 
@@ -36,6 +40,48 @@ class TestMain(TestCase):
             '<a class="page_link" href="/page-index/#page_590">PG.\xa0590</a>',
             results)
 
+    def post_process_example(self, post_process):
+        soup = BeautifulSoup(
+            '<h2>Housing</h2>'
+            '<p>Rent<sup><a href="#footnote-2" id="footnote-ref-2">[2]</a>'
+            '</sup> is due, see PG. 12.</p>'
+            '<h3>Jobs</h3>'
+            '<p>Work<sup><a href="#footnote-1" id="footnote-ref-1">[1]</a>'
+            '</sup> hard.</p>'
+            '<ol><li id="footnote-1"><p>First note</p></li>'
+            '<li id="footnote-2"><p>Second note</p></li></ol>',
+            'html.parser')
+        footnote_index = main.extract_footnotes(soup)
+        soup.ol.extract()
+        items = [
+            main.data.SingleArticle(
+                title='Housing', level=4, contents=soup.contents[0:2]),
+            main.data.SingleArticle(
+                title='Jobs', level=4, contents=soup.contents[2:4])]
+        post_process(soup, items, footnote_index)
+        return [item.contents.html for item in items]
+
+    def test_post_process_content_items_matches_serial_processing(self):
+        def post_process_serially(soup, items, footnote_index):
+            for item in items:
+                main.add_footnotes_to_article(soup, item, footnote_index)
+                main.extract_redundant_title_heading(item)
+                main.add_page_links_to_article(item)
+                item.contents = main.data.ArticleContents.from_nodes(
+                    item.contents)
+
+        def post_process_in_parallel(soup, items, footnote_index):
+            main.post_process_content_items(items, footnote_index, workers=2)
+
+        expected = self.post_process_example(post_process_serially)
+        results = self.post_process_example(post_process_in_parallel)
+        self.assertEqual(results, expected)
+        self.assertNotIn('<h2>', results[0])
+        self.assertIn('Second note', results[0])
+        self.assertNotIn('First note', results[0])
+        self.assertIn('First note', results[1])
+        self.assertIn('href="/page-index/#page_12"', results[0])
+
     def test_remove_trailing_footnote_text(self):
         test_strings = [
             'How do[7653] services or programs?[34]'
@@ -46,5 +92,203 @@ class TestMain(TestCase):
                 self.assertEqual(
                         result, 'How do services or programs?')
 
+    def test_convert_docx_streams_images_and_caches_by_hash(self):
+        image = Mock(content_type='image/png', alt_text=None)
+        image.open.side_effect = lambda: io.BytesIO(b'png bytes')
+
+        def fake_convert(docx_file, style_map, convert_image):
+            convert_image(image)
+            return Mock(value='<p><img src="1.png"/></p>', messages=[])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            docx_path = os.path.join(tmp, 'source.docx')
+            style_map_path = os.path.join(tmp, 'stylemap.txt')
+            with open(docx_path, 'wb') as docx_file:
+                docx_file.write(b'docx bytes')
+            with open(style_map_path, 'w') as style_map_file:
+                style_map_file.write('p.RR-Text => p.text:fresh')
+            output = os.path.join(tmp, 'output')
+            cache = os.path.join(tmp, 'cache')
+            other_output = os.path.join(tmp, 'other-output')
+            with patch.object(main, 'CONVERSION_CACHE_DIRECTORY', cache), \
+                    patch('mammoth.convert_to_html',
+                          side_effect=fake_convert) as convert:
+                first = main.convert_docx(docx_path, style_map_path, output)
+                os.remove(os.path.join(output, 'img', '1.png'))
+                second = main.convert_docx(docx_path, style_map_path, output)
+                third = main.convert_docx(
+                    docx_path, style_map_path, other_output)
+                self.assertEqual(convert.call_count, 1)
+                with open(docx_path, 'wb') as docx_file:
+                    docx_file.write(b'new docx bytes')
+                main.convert_docx(docx_path, style_map_path, output)
+            self.assertEqual(convert.call_count, 2)
+            self.assertEqual(first, second)
+            self.assertEqual(first, third)
+            # only the latest conversion of the document is kept
+            self.assertEqual(os.listdir(cache), [
+                main.get_conversion_key(docx_path, 'p.RR-Text => p.text:fresh')
+            ])
+            for folder in (output, other_output):
+                with open(os.path.join(folder, 'img', '1.png'), 'rb') as img:
+                    self.assertEqual(img.read(), b'png bytes')
+            # each image is written once and linked into the cache
+            cached_image = os.path.join(
+                cache, os.listdir(cache)[0], 'img', '1.png')
+            self.assertTrue(os.path.samefile(
+                cached_image, os.path.join(output, 'img', '1.png')))
 
+    def test_run_links_built_assets_into_another_edition(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            gulp_output = os.path.join(tmp, 'roadmap-to-html')
+            for asset_path in main.assets.BUILT_ASSETS:
+                os.makedirs(os.path.join(
+                    gulp_output, os.path.dirname(asset_path)), exist_ok=True)
+                with open(os.path.join(gulp_output, asset_path), 'w') as f:
+                    f.write('/* {} */'.format(asset_path))
+            edition = main.BuildConfig(
+                name='2019', output_dir=os.path.join(tmp, 'roadmap-2019'),
+                prefix='/2019')
+            with patch.object(
+                        main.assets, 'BUILT_ASSETS_DIRECTORY', gulp_output), \
+                    patch.object(main.deploy, 'DEPLOY_STATE_DIRECTORY',
+                                 os.path.join(tmp, 'deploy')), \
+                    patch.object(main, 'get_raw_html', return_value=''), \
+                    patch.object(main, 'parse_content_items',
+                                 return_value=([], main.data.PageIndex())), \
+                    patch.dict(main.data.global_context):
+                main.run(edition)
+            manifest_path = os.path.join(
+                edition.output_dir, main.assets.ASSET_MANIFEST_NAME)
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            self.assertEqual(
+                sorted(manifest), sorted(main.assets.BUILT_ASSETS))
+            for fingerprinted_path in manifest.values():
+                self.assertTrue(os.path.exists(
+                    os.path.join(edition.output_dir, fingerprinted_path)))
+            with open(os.path.join(edition.output_dir, 'index.html')) as f:
+                self.assertIn(
+                    '/2019/' + manifest['css/style.css'], f.read())
 
+    def test_run_reports_removed_article_as_deleted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = main.BuildConfig(output_dir=os.path.join(tmp, 'site'))
+            chapter = main.data.ChapterIndex(
+                title='Housing', level=0, contents=main.data.ArticleContents(
+                    '', [], '', []))
+            with patch.object(main.deploy, 'DEPLOY_STATE_DIRECTORY',
+                              os.path.join(tmp, 'deploy')), \
+                    patch.object(main, 'get_raw_html', return_value=''), \
+                    patch.object(main, 'parse_content_items') as parse, \
+                    patch.dict(main.data.global_context):
+                parse.return_value = ([chapter], main.data.PageIndex())
+                main.run(config, optimize_assets=False, check_links=False)
+                main.deploy.publish(
+                    os.path.join(tmp, 'target'), config.output_dir)
+                parse.return_value = ([], main.data.PageIndex())
+                main.run(config, optimize_assets=False, check_links=False)
+                with open(main.deploy.get_manifest_path(
+                        config.output_dir)) as manifest_file:
+                    manifest = json.load(manifest_file)
+            self.assertEqual(manifest['deleted'], ['housing/index.html'])
+            self.assertFalse(os.path.exists(
+                os.path.join(config.output_dir, 'housing')))
+
+    def test_unstaged_run_skips_staging_and_deploy_manifest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = main.BuildConfig(output_dir=os.path.join(tmp, 'site'))
+            with patch.object(main, 'get_raw_html', return_value=''), \
+                    patch.object(main, 'parse_content_items',
+                                 return_value=([], main.data.PageIndex())), \
+                    patch.object(main.output, 'link_tree') as link_tree, \
+                    patch.object(main.deploy, 'write_deploy_manifest') as \
+                    write_deploy_manifest, \
+                    patch.dict(main.data.global_context):
+                main.run(
+                    config, optimize_assets=False, check_links=False,
+                    staged=False)
+            self.assertTrue(os.path.exists(
+                os.path.join(config.output_dir, 'index.html')))
+        link_tree.assert_not_called()
+        write_deploy_manifest.assert_not_called()
+
+    def test_load_editions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            editions_path = os.path.join(tmp, 'editions.json')
+            with open(editions_path, 'w') as editions_file:
+                json.dump([
+                    dict(name='default'),
+                    dict(name='2019', source_docx='source-2019.docx',
+                         output_dir='roadmap-2019', prefix='/2019',
+                         algolia_index_name='ROADMAP_2019')],
+                    editions_file)
+            default, edition = main.load_editions(editions_path)
+        self.assertEqual(default.output_dir, main.OUTPUT_DIRECTORY)
+        self.assertEqual(default.contents_json, 'all_contents.json')
+        self.assertEqual(edition.source_docx, 'source-2019.docx')
+        self.assertEqual(edition.style_map, main.STYLE_MAP_PATH)
+        self.assertEqual(edition.prefix, '/2019')
+        self.assertEqual(edition.algolia_index_name, 'ROADMAP_2019')
+        self.assertEqual(edition.contents_json, 'all_contents-2019.json')
+        self.assertEqual(
+            edition.raw_index_path,
+            os.path.join('roadmap-2019', 'raw_index.html'))
+
+    def test_find_pages_using_templates(self):
+        article = main.data.SingleArticle(title='Article', level=4)
+        splash_page = main.data.SplashPage(title='Home', level='splash')
+        pages = [article, splash_page]
+        self.assertEqual(
+            main.find_pages_using_templates(pages, {'splash_page.jinja'}),
+            [splash_page])
+        self.assertEqual(
+            main.find_pages_using_templates(pages, {'footer.jinja'}),
+            pages)
+
+    def test_merge_adjacent_chapter_items(self):
+        raw_chapters = [
+            main.data.Chapter('CHAPTER 1:', '000010'),
+            main.data.Chapter('EMPLOYMENT', '000011'),
+            main.data.Chapter('& INCOME', '000013'),
+            main.data.Chapter('CHAPTER 2: HOUSING', '000400'),
+            main.data.Chapter('CHAPTER 2: HOUSING', '000410'),
+            main.data.Chapter('CHAPTER 3: EDUCATION', '000900'),
+        ]
+        original = list(raw_chapters)
+        chapters = main.merge_adjacent_chapter_items(raw_chapters)
+        self.assertEqual(raw_chapters, original)
+        self.assertEqual(
+            [chapter.text for chapter in chapters],
+            ['CHAPTER 1: EMPLOYMENT & INCOME', 'CHAPTER 2: HOUSING',
+             'CHAPTER 3: EDUCATION'])
+        self.assertEqual(chapters[0].merged_from, original[:3])
+        self.assertEqual(chapters[1].merged_from, original[3:5])
+        self.assertEqual(chapters[2].soup_index, '000900')
+
+    def test_merge_adjacent_chapter_items_merges_long_runs(self):
+        raw_chapters = [
+            main.data.Chapter(text, '0000{}'.format(index))
+            for index, text in enumerate(
+                ['CHAPTER 4:', 'UNDERSTANDING', '&', 'CLEANING UP', 'YOUR',
+                 'CRIMINAL RECORD'], start=10)]
+        raw_chapters.append(main.data.Chapter('CHAPTER 5: FAMILY', '000900'))
+        chapters = main.merge_adjacent_chapter_items(raw_chapters)
+        self.assertEqual(
+            [chapter.text for chapter in chapters],
+            ['CHAPTER 4: UNDERSTANDING & CLEANING UP YOUR CRIMINAL RECORD',
+             'CHAPTER 5: FAMILY'])
+        self.assertEqual(chapters[0].merged_from, raw_chapters[:6])
+
+    def test_merge_adjacent_chapter_items_skips_empty_headings(self):
+        raw_chapters = [
+            main.data.Chapter('CHAPTER 1: EMPLOYMENT', '000010'),
+            main.data.Chapter('', '000011'),
+            main.data.Chapter('CHAPTER 2: HOUSING', '000400'),
+            main.data.Chapter(' ', '000401'),
+            main.data.Chapter('CHAPTER 3', '000900'),
+        ]
+        chapters = main.merge_adjacent_chapter_items(raw_chapters)
+        self.assertEqual(
+            [chapter.text for chapter in chapters],
+            ['CHAPTER 1: EMPLOYMENT', 'CHAPTER 2: HOUSING', 'CHAPTER 3'])
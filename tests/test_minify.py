@@ -0,0 +1,41 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import minify
+
+
+class TestMinify(TestCase):
+
+    def test_minify_html(self):
+        html = '''<!doctype html>
+        <html>
+          <!-- a comment -->
+          <!--[if IE]><p>old browser</p><![endif]-->
+          <body>
+            <p class="text">Some    text
+                with <a href="/">a   link</a> in it.</p>
+            <pre>  keep
+    this   </pre>
+            <script>var a  =  1;</script>
+          </body>
+        </html>'''
+        self.assertEqual(
+            minify.minify_html(html),
+            '<!doctype html>\n<html>\n<!--[if IE]><p>old browser</p>'
+            '<![endif]-->\n<body>\n<p class="text">Some text\nwith '
+            '<a href="/">a link</a> in it.</p>\n<pre>  keep\n    this   '
+            '</pre>\n<script>var a  =  1;</script>\n</body>\n</html>')
+
+    def test_minify_html_keeps_no_break_spaces(self):
+        self.assertEqual(
+            minify.minify_html('<p>PG.\xa0594 and\xa0\xa0x  y</p>'),
+            '<p>PG.\xa0594 and\xa0\xa0x y</p>')
+
+    def test_minify_page_records_bytes_saved(self):
+        with patch.object(minify, 'stats', minify.MinificationStats()):
+            self.assertEqual(
+                minify.minify_page('<p>a    b</p>', 'article'), '<p>a b</p>')
+            minify.minify_page('<p>\xa0\n\n  c</p>', 'article')
+            self.assertEqual(
+                minify.stats.report(),
+                'article: 2 pages, 3 bytes saved per page (22%)')
@@ -0,0 +1,61 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from bs4 import BeautifulSoup
+
+import data
+import main
+import offline
+
+
+class TestOffline(TestCase):
+
+    def test_build_precache_manifest(self):
+        chapter = data.ChapterIndex(title='housing', level=0)
+        section = data.ChapterSection(title='Renting', level=1)
+        article = data.SingleArticle(
+            title='Can I rent?', level=4,
+            contents=data.ArticleContents.from_nodes(BeautifulSoup(
+                '<p><img src="/img/1.png"/></p>', 'html.parser').contents))
+        other_chapter = data.ChapterIndex(title='education', level=0)
+        content_items = [chapter, section, article, other_chapter]
+        main.link_parents_and_neighbors(content_items)
+        for number, item in enumerate(content_items):
+            item.content_hash = str(number)
+        splash_page = data.SplashPage(title='Home', level='splash')
+        splash_page.content_hash = 'home'
+        manifest = offline.build_precache_manifest(
+            content_items + [splash_page])
+
+        self.assertEqual(manifest['shell'], [
+            '/', '/css/style.css', '/js/index.js'])
+        self.assertEqual(manifest['chapters']['housing'], dict(
+            title='Housing',
+            pages={
+                '/housing/': '0',
+                '/housing/renting/': '1',
+                '/housing/renting/can-i-rent/': '2'},
+            assets=['/img/1.png']))
+        self.assertEqual(
+            manifest['chapters']['education']['pages'],
+            {'/education/': '3'})
+        self.assertEqual(article.get_chapter(), chapter)
+        self.assertIsNone(splash_page.get_chapter())
+
+    def test_service_worker_serves_only_fingerprinted_urls_from_cache(self):
+        asset_manifest = {
+            'css/style.css': 'css/style.0123456789.css',
+            'img/1.png': 'img/1.abcdef0123.png'}
+        with tempfile.TemporaryDirectory() as output_dir, \
+                patch.dict(data.global_context, prefix='/2019',
+                           asset_manifest=asset_manifest):
+            offline.write_offline_bundle([], output_dir)
+            with open(os.path.join(
+                    output_dir, offline.SERVICE_WORKER_NAME)) as worker:
+                service_worker = worker.read()
+        self.assertIn(
+            '["/2019/css/style.0123456789.css", '
+            '"/2019/img/1.abcdef0123.png"].forEach', service_worker)
+        self.assertIn('if (isFingerprinted(request.url))', service_worker)
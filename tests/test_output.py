@@ -0,0 +1,77 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import output
+from tests.helpers import write_files
+
+
+class TestOutput(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.tmp.name, 'site')
+        write_files(self.output_dir, {
+            'index.html': 'old home', 'css/style.css': 'body {}'})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_live(self, relative_path):
+        with open(os.path.join(self.output_dir, relative_path)) as live_file:
+            return live_file.read()
+
+    def test_swaps_staged_tree_into_place(self):
+        with output.OutputWriter(self.output_dir) as writer:
+            writer.write('index.html', 'new home')
+            writer.write('housing/index.html', 'housing')
+            writer.write('css/style.css', 'body {}')
+            self.assertEqual(self.read_live('index.html'), 'old home')
+        self.assertEqual(self.read_live('index.html'), 'new home')
+        self.assertEqual(self.read_live('housing/index.html'), 'housing')
+        self.assertEqual((writer.written, writer.unchanged), (2, 1))
+        self.assertEqual(
+            sorted(os.listdir(self.tmp.name)), ['site'])
+
+    def test_failed_build_leaves_live_tree_untouched(self):
+        with self.assertRaises(ValueError):
+            with output.OutputWriter(self.output_dir) as writer:
+                writer.write('index.html', 'new home')
+                writer.write('housing/index.html', 'housing')
+                raise ValueError('template error')
+        self.assertEqual(self.read_live('index.html'), 'old home')
+        self.assertFalse(
+            os.path.exists(os.path.join(self.output_dir, 'housing')))
+        self.assertEqual(
+            sorted(os.listdir(self.tmp.name)), ['site'])
+
+    def test_recovers_from_interrupted_swap(self):
+        os.rename(self.output_dir, self.output_dir + output.PREVIOUS_SUFFIX)
+        with output.OutputWriter(self.output_dir) as writer:
+            writer.write('housing/index.html', 'housing')
+        self.assertEqual(self.read_live('css/style.css'), 'body {}')
+        self.assertEqual(self.read_live('housing/index.html'), 'housing')
+
+    def test_write_file_does_not_change_other_links(self):
+        path = os.path.join(self.output_dir, 'index.html')
+        link_path = os.path.join(self.tmp.name, 'link.html')
+        os.link(path, link_path)
+        output.write_file(path, 'new home')
+        with open(link_path) as link_file:
+            self.assertEqual(link_file.read(), 'old home')
+        self.assertEqual(self.read_live('index.html'), 'new home')
+
+    def test_removes_pages_the_build_did_not_write(self):
+        write_files(self.output_dir, {
+            'old-slug/index.html': 'renamed article',
+            'raw_index.html': 'raw', 'img/1.png': 'png'})
+        with output.OutputWriter(
+                self.output_dir, kept_pages=['raw_index.html']) as writer:
+            writer.write('index.html', 'new home')
+            writer.write('new-slug/index.html', 'renamed article')
+        self.assertEqual(writer.removed, 1)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.output_dir, 'old-slug')))
+        for relative_path in ('raw_index.html', 'img/1.png', 'css/style.css'):
+            self.assertTrue(
+                os.path.exists(os.path.join(self.output_dir, relative_path)))
@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+import numpy as np
+from bs4 import BeautifulSoup
+
+import data
+import main
+import related
+
+
+def make_article(title, text, level=4):
+    contents = data.ArticleContents.from_nodes(BeautifulSoup(
+        '<p>{}</p>'.format(text), 'html.parser').contents)
+    return data.SingleArticle(title=title, level=level, contents=contents)
+
+
+class TestRelated(TestCase):
+
+    def test_find_most_similar_skips_same_group(self):
+        matrix = np.array([
+            [1, 0, 0],
+            [1, 0, 0],
+            [0.8, 0.6, 0],
+            [0, 0, 1],
+        ], dtype=np.float32)
+        results = related.find_most_similar(
+            matrix, groups=[0, 0, 1, 2], count=2, block_size=3)
+        self.assertEqual(results, [[2], [2], [0, 1], []])
+
+    def test_link_related_articles(self):
+        housing = data.ChapterIndex(title='housing', level=0)
+        eviction = make_article(
+            'Eviction notices', 'eviction notice court')
+        deposits = make_article(
+            'Security deposits', 'deposit refund')
+        employment = data.ChapterIndex(title='employment', level=0)
+        wages = make_article(
+            'Wage garnishment', 'wages garnishment court')
+        references = make_article(
+            'Landlord references', 'eviction notice reference')
+        content_items = [
+            housing, eviction, deposits, employment, wages, references]
+        main.link_parents_and_neighbors(content_items)
+        related.link_related_articles(content_items)
+        self.assertEqual(eviction.related, [references, wages])
+        self.assertEqual(wages.related, [eviction])
+        self.assertEqual(housing.related, [])